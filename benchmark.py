@@ -0,0 +1,376 @@
+'''
+Benchmarks for tsp-genetic-python.py
+
+Runs the solver with fixed seeds on the bundled instances and times a few of its operators.
+Writes the results to a JSON file, and compares them with a saved baseline to flag regressions:
+
+    python benchmark.py --output baseline.json
+    (change the code)
+    python benchmark.py --output new.json --baseline baseline.json
+
+Parameters of the solver can be changed with --set, e.g. --set crossover_operator=eax --set local_search=elite,
+or --set n_workers=4 for the parallel breeding (values are read as Python literals). Exits with status 1 when a regression is found.
+'''
+
+import argparse
+import ast
+import contextlib
+import csv
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOLVER_PATH = os.path.join(HERE, 'tsp-genetic-python.py')
+
+# name --> (path, loader, optimal tour length, generations, population size)
+# The optimum of cities.csv (the att48 cities) is for plain unrounded Euclidean distances,
+# which is what calculate_distances() uses; the TSPLIB value 10628 is for ATT distances.
+INSTANCES = {
+    'bays29': ('data/bays29.in', 'instance', 2020, 300, 100),
+    'd493': ('data/d493.in', 'instance', 35002, 150, 100),
+    'pr2392': ('data/pr2392-2.in', 'instance', 378032, 60, 60),
+    'cities': ('cities.csv', 'csv', 33523.708, 300, 100),
+}
+
+# Instance on which the operators are timed
+MICRO_INSTANCE = 'd493'
+
+# Gaps to the optimum (in %) for which the benchmark records the first generation reaching them
+TARGET_GAPS = (5.0, 1.0)
+
+# Relative slowdown (or memory growth) above which a result counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+
+def load_solver(seed, overrides):
+    '''
+    int, dict --> module
+
+    Imports a fresh copy of tsp-genetic-python.py (its name is not a valid module name, and a fresh
+    copy starts without cities), seeded with seed and with the parameters in overrides set.
+    '''
+    spec = importlib.util.spec_from_file_location('tsp_genetic_python', SOLVER_PATH)
+    solver = importlib.util.module_from_spec(spec)
+    # registered under its name so that its functions can be pickled for the worker processes
+    sys.modules[spec.name] = solver
+    spec.loader.exec_module(solver)
+    for name, value in overrides.items():
+        if not hasattr(solver, name):
+            raise ValueError('unknown parameter: {0}'.format(name))
+        setattr(solver, name, value)
+    solver.report_mode = 'quiet'
+    solver.metrics_path = None
+    solver.random_seed = seed
+    solver.rng = np.random.default_rng(seed)
+    return solver
+
+
+def load_cities(solver, name):
+    '''
+    module, str --> float
+
+    Loads instance name into solver, returns the seconds it took.
+    '''
+    path, loader = INSTANCES[name][:2]
+    start = time.perf_counter()
+    if loader == 'csv':
+        with open(os.path.join(HERE, path), 'rt') as f:
+            for row in csv.reader(f):
+                solver.City(row[0], float(row[1]), float(row[2]))
+        solver.calculate_distances()
+    else:
+        solver.load_instance(os.path.join(HERE, path))
+    return time.perf_counter() - start
+
+
+class RunRecorder(object):
+    '''
+    Reporter for App(): keeps what the benchmark needs from a run, including the first generation
+    whose best route is within each of TARGET_GAPS of optimum (None until it is reached).
+    (Defined as a plain class because each fresh solver module has its own Reporter class.)
+    '''
+    def __init__(self, optimum):
+        self.optimum = optimum
+        self.generations = 0
+        self.ga_seconds = None
+        self.best_length = None
+        self.generations_to_gap = dict.fromkeys(TARGET_GAPS)
+
+    def start(self, n_generations):
+        pass
+
+    def generation(self, generation, population, best_route, elapsed):
+        self.generations = generation
+        self.ga_seconds = elapsed
+        for gap, reached in self.generations_to_gap.items():
+            if reached is None and best_route.length <= self.optimum * (1.0 + gap / 100.0):
+                self.generations_to_gap[gap] = generation
+
+    def finish(self, best_route, elapsed):
+        self.best_length = float(best_route.length)
+
+
+def solve(solver, n_generations, pop_size, optimum):
+    '''
+    module, int, int, float --> RunRecorder()
+
+    Runs App() headless and without output.
+    '''
+    recorder = RunRecorder(optimum)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        solver.App(n_generations, pop_size, reporters=[recorder])
+    return recorder
+
+
+def bench_instance(name, seed, overrides, memory=True):
+    '''
+    str, int, dict, bool --> dict
+
+    Solves instance name and returns its timings, final length, gap to the optimum (in %) and the
+    generations it took to get within each of TARGET_GAPS (keyed '5%', '1%'..., None if never).
+    With memory, the run is repeated with the same seed under tracemalloc for the peak memory
+    (not in the timed run: tracing slows Python code down).
+    '''
+    path, loader, optimum, n_generations, pop_size = INSTANCES[name]
+    solver = load_solver(seed, overrides)
+    load_seconds = load_cities(solver, name)
+    start = time.perf_counter()
+    recorder = solve(solver, n_generations, pop_size, optimum)
+    wall_seconds = time.perf_counter() - start
+
+    result = {'cities': len(solver.list_of_cities),
+              'generations': n_generations,
+              'population': pop_size,
+              'load_seconds': load_seconds,
+              'wall_seconds': wall_seconds,
+              'gens_per_sec': recorder.generations / recorder.ga_seconds if recorder.ga_seconds else None,
+              'best_length': recorder.best_length,
+              'optimum': optimum,
+              'gap': 100.0 * (recorder.best_length - optimum) / optimum,
+              'generations_to_gap': {'{0:g}%'.format(gap): reached for gap, reached in recorder.generations_to_gap.items()}}
+
+    if memory:
+        solver = load_solver(seed, overrides)
+        load_cities(solver, name)
+        tracemalloc.start()
+        try:
+            solve(solver, n_generations, pop_size, optimum)
+            result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def time_call(function, number, repeat=5):
+    '''
+    callable, int, int --> float
+
+    Seconds per call of function: the best of repeat rounds of number calls.
+    '''
+    return min(timeit.Timer(function).repeat(repeat=repeat, number=number)) / number
+
+
+def bench_operators(seed, overrides):
+    '''
+    int, dict --> dict
+
+    Times the operators of a generation on MICRO_INSTANCE, in seconds per call. For whole
+    generations, also measures the memory allocated by each (see generation_allocations()).
+    '''
+    solver = load_solver(seed, overrides)
+    load_cities(solver, MICRO_INSTANCE)
+    pop_size = INSTANCES[MICRO_INSTANCE][4]
+    population = solver.RoutePop(pop_size, True)
+    ga = solver.GA()
+    parent1, parent2 = population.rt_pop[0], population.rt_pop[1]
+    route = solver.Route(parent1.route.copy())
+    ga.breed(population, solver.RoutePop(pop_size, False), 0)  # sizes the workspace
+
+    # the generations follow each other, so that evolve_population() reuses its spare population
+    generations = [solver.RoutePop(pop_size, True)]
+
+    def evolve():
+        generations[0] = ga.evolve_population(generations[0])
+
+    results = {
+        'recalc_rt_len': time_call(route.recalc_rt_len, 2000),
+        'crossover': time_call(lambda: ga.crossover(parent1, parent2), 500),
+        'mutate': time_call(lambda: ga.mutate(route), 20000),
+        'tournament_select': time_call(lambda: ga.tournament_select(population), 20000),
+        'select_parents': time_call(lambda: ga.select_parents(population, pop_size), 2000),
+        'evolve_population': time_call(evolve, 20),
+    }
+    results = {name: {'seconds_per_call': seconds} for name, seconds in results.items()}
+    results['evolve_population'].update(generation_allocations(evolve))
+    return results
+
+
+def generation_allocations(evolve, n_generations=20):
+    '''
+    callable, int --> dict
+
+    Memory allocated by a generation (a call of evolve), under tracemalloc: the mean peak of
+    the memory allocated during the generation, above what was allocated before it, and the
+    mean number of memory blocks still allocated after it.
+    '''
+    evolve()  # the workspace and the spare population are allocated by the first generations
+    evolve()
+    peak_bytes = blocks = 0
+    tracemalloc.start()
+    try:
+        for _ in range(n_generations):
+            before = tracemalloc.get_traced_memory()[0]
+            before_blocks = sys.getallocatedblocks()
+            tracemalloc.reset_peak()
+            evolve()
+            peak_bytes += tracemalloc.get_traced_memory()[1] - before
+            blocks += sys.getallocatedblocks() - before_blocks
+    finally:
+        tracemalloc.stop()
+    return {'peak_alloc_bytes_per_generation': peak_bytes / float(n_generations),
+            'net_blocks_per_generation': blocks / float(n_generations)}
+
+
+def compare(results, baseline, tolerance):
+    '''
+    dict, dict, float --> list of str
+
+    Regressions of results against baseline: times and memory more than tolerance (relative)
+    above the baseline, any increase of the gap to the optimum (the runs are seeded), and more
+    generations to reach a target gap (or not reaching it any more).
+    '''
+    regressions = []
+
+    def check(label, new, old, relative=True):
+        if new is None or old is None:
+            return
+        limit = old * (1.0 + tolerance) if relative else old + 1e-9
+        if new > limit:
+            regressions.append('{0}: {1:.6g} (baseline {2:.6g})'.format(label, new, old))
+
+    for name, result in results['instances'].items():
+        old = baseline.get('instances', {}).get(name)
+        if old is None:
+            continue
+        check(name + ' wall_seconds', result['wall_seconds'], old.get('wall_seconds'))
+        check(name + ' peak_memory_bytes', result.get('peak_memory_bytes'), old.get('peak_memory_bytes'))
+        check(name + ' gap', result['gap'], old.get('gap'), relative=False)
+        for gap, reached in old.get('generations_to_gap', {}).items():
+            new = result['generations_to_gap'].get(gap)
+            if reached is not None and new is None:
+                regressions.append('{0} generations to {1} gap: not reached (baseline {2})'.format(name, gap, reached))
+            else:
+                check('{0} generations to {1} gap'.format(name, gap), new, reached, relative=False)
+    for name, result in results['operators'].items():
+        old = baseline.get('operators', {}).get(name)
+        if old is not None:
+            check(name + ' seconds_per_call', result['seconds_per_call'], old.get('seconds_per_call'))
+            check(name + ' peak_alloc_bytes_per_generation', result.get('peak_alloc_bytes_per_generation'),
+                  old.get('peak_alloc_bytes_per_generation'))
+    return regressions
+
+
+def print_results(results):
+    '''
+    dict --> None
+    '''
+    gaps = ['{0:g}%'.format(gap) for gap in TARGET_GAPS]
+    print('{0:<10} {1:>7} {2:>9} {3:>9} {4:>13} {5:>8} {6:>10}'.format(
+        'instance', 'cities', 'wall (s)', 'gens/s', 'best length', 'gap (%)', 'peak (MB)')
+        + ''.join(' {0:>9}'.format('gen ' + gap) for gap in gaps))
+    for name, r in results['instances'].items():
+        peak = r.get('peak_memory_bytes')
+        print('{0:<10} {1:>7} {2:>9.2f} {3:>9.1f} {4:>13.2f} {5:>8.2f} {6:>10}'.format(
+            name, r['cities'], r['wall_seconds'], r['gens_per_sec'] or 0.0, r['best_length'], r['gap'],
+            '-' if peak is None else '{0:.1f}'.format(peak / 2.0**20))
+            + ''.join(' {0:>9}'.format('-' if r['generations_to_gap'][gap] is None else r['generations_to_gap'][gap])
+                      for gap in gaps))
+    if results['operators']:
+        print(' ')
+        print('{0:<20} {1:>14}'.format('operator', 'us per call'))
+        for name, r in results['operators'].items():
+            print('{0:<20} {1:>14.2f}'.format(name, r['seconds_per_call'] * 1e6))
+        evolve = results['operators'].get('evolve_population', {})
+        if 'peak_alloc_bytes_per_generation' in evolve:
+            print(' ')
+            print('Allocated per generation: {0:.1f} kB at the peak, {1:.1f} blocks left'.format(
+                evolve['peak_alloc_bytes_per_generation'] / 1024.0, evolve['net_blocks_per_generation']))
+
+
+def parse_overrides(assignments):
+    '''
+    list of str --> dict
+
+    Reads the 'name=value' parameters given with --set.
+    '''
+    overrides = {}
+    for assignment in assignments:
+        name, _, value = assignment.partition('=')
+        try:
+            overrides[name.strip()] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[name.strip()] = value
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks tsp-genetic-python.py on the bundled instances.')
+    parser.add_argument('--instances', nargs='+', choices=sorted(INSTANCES), default=list(INSTANCES))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='NAME=VALUE',
+                        help='sets a parameter of the solver')
+    parser.add_argument('--no-memory', action='store_true', help='skips the peak memory runs')
+    parser.add_argument('--no-operators', action='store_true', help='skips the operator timings')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='JSON file of earlier results to compare with')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='relative slowdown flagged as a regression (default %(default)s)')
+    args = parser.parse_args(argv)
+    overrides = parse_overrides(args.overrides)
+
+    results = {'python': platform.python_version(),
+               'numpy': np.__version__,
+               'machine': platform.machine(),
+               'seed': args.seed,
+               'parameters': overrides,
+               'instances': {},
+               'operators': {}}
+    for name in args.instances:
+        print('Running {0}...'.format(name))
+        results['instances'][name] = bench_instance(name, args.seed, overrides, memory=not args.no_memory)
+    if not args.no_operators:
+        print('Timing the operators on {0}...'.format(MICRO_INSTANCE))
+        results['operators'] = bench_operators(args.seed, overrides)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(' ')
+    print_results(results)
+    print(' ')
+    print('Results written to {0}'.format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('parameters') != overrides or baseline.get('seed') != args.seed:
+            print('Warning: the baseline was run with other parameters or another seed')
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('Regressions against {0}:'.format(args.baseline))
+            for regression in regressions:
+                print('    ' + regression)
+            return 1
+        print('No regression against {0}'.format(args.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,12 +11,24 @@ Written for Python 3.1+
 
 '''
 
-import random
-import copy
 import os
+import sys
 import time
 import math
 import csv
+import json
+import queue
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+import atexit
+import cProfile
+
+import numpy as np
+
+import tsplib
 
 try:
     from tkinter import *
@@ -27,32 +39,155 @@ except Exception as e:
 
 list_of_cities =[]
 
+# Shared distance matrix: dist_matrix[i, j] is the distance between list_of_cities[i] and list_of_cities[j].
+# Filled by calculate_distances() (coordinates) or set_distance_matrix() (explicit weights). For coordinate
+# instances too large for an n x n matrix it is a tsplib.CoordinateDistances, computing distances on demand.
+dist_matrix = None
+
+# Coordinates of the cities as an (n x 2) array, or None for instances given as explicit weights.
+city_coords = None
+# How the distances follow from city_coords ('EUC', 'EUC_2D', 'GEO'... see tsplib.pair_distances), or None
+distance_type = None
+
+# Candidate neighbours: neighbor_lists[i] holds the k_neighbors cities closest to city i, nearest first.
+# Built on demand by get_neighbor_lists() and reset whenever the distances change.
+neighbor_lists = None
+_neighbor_lists_py = None
+
+# FitnessMemo of this process (see get_fitness_memo()), reset whenever the distances change.
+_fitness_memo = None
+
 #########################################
 ######                             ######
 ######    Algorithm paremeters:    ######
 ######                             ######
 #########################################
 
+# Crossover operator, one of crossover_operators: 'ox' (order crossover, GA.crossover_ox), 'erx'
+# (edge recombination, GA.crossover_erx) or 'eax' (edge assembly crossover, GA.crossover_eax)
+crossover_operator = 'ox'
+# For 'eax': number of AB-cycles tried for every child, the shortest child being kept
+eax_trials = 5
+
 # probability that an individual Route will mutate
 k_mut_prob = 0.4
 
+# Mutation operator: 'swap' (GA.mutate, swaps two random cities) or
+# 'or_opt' (GA.mutate_or_opt, moves a short segment next to one of its nearest cities)
+mutation_operator = 'swap'
+
 # Number of generations to run for
 k_n_generations = 100
 # Population size of 1 generation (RoutePop)
 k_population_size = 100
 
+# Parent selection: 'tournament' (the shortest of tournament_size random routes), 'rank' (linear
+# ranking) or 'sus' (stochastic universal sampling with the linear ranking probabilities)
+selection = 'tournament'
+
 # Size of the tournament selection. 
 tournament_size = 7
 
+# For 'rank' and 'sus' selection: how many times more likely the best route is picked than
+# the median one (between 1.0, no preference, and 2.0, the worst route is never picked)
+rank_pressure = 1.5
+
 # If elitism is True, the best from one generation will carried over to the next.
 elitism = True
 
+# Number of nearest neighbours each city tries to connect to in the local search
+k_neighbors = 10
+
+# Share of the initial population built by each construction heuristic, the rest being random routes:
+# 'nearest_neighbor' (greedy from a random city), 'greedy_edge' (shortest edges first),
+# 'space_filling_curve' (Hilbert curve order) and 'random_insertion'.
+# For instance {'nearest_neighbor': 0.3, 'greedy_edge': 0.1, 'random_insertion': 0.2}. Empty: all random.
+initial_population_mix = {}
+
+# Local search operators, applied in this order until none of them improves the route:
+# '2opt' (GA.improve_2opt), 'or_opt' (GA.improve_or_opt) and 'or_3opt' (GA.improve_or_3opt)
+local_search_operators = ['2opt', 'or_opt']
+
+# Local search run on every new generation: None, 'elite' (only the fittest route) or 'all' (every route)
+local_search = None
+
+# If True, the overall best route is improved with local search once the generations are done
+polish_best_route = True
+
+# Number of best distinct routes kept over the whole run (see HallOfFame). At least 1: the best route is always kept
+hall_of_fame_size = 10
+
+# Number of route lengths remembered by tour (see FitnessMemo), so that a child identical to a route
+# already seen isn't evaluated again. 0: no memo. Only used when distances are computed on demand (with
+# a full distance matrix, evaluating a route costs less than looking it up), and worth it there only when
+# many children repeat tours already seen. Each entry holds its tour (4 bytes per city).
+fitness_memo_size = 0
+
+# If True, a child identical to another route of its generation (even rotated or reversed) is
+# changed by random swaps until it is unique, so that no slot of the population is wasted.
+reject_duplicates = False
+
+# Number of worker processes that breed each generation (1 = everything runs in this process).
+# Results are reproducible for a given random_seed and n_workers.
+n_workers = 1
+
+# Island model: number of populations (of pop_size routes each) evolving side by side in their
+# own processes (1 = a single population). Every migration_interval generations each island sends
+# copies of its n_migrants best routes to its neighbours, where they replace the worst routes.
+n_islands = 1
+migration_interval = 10
+n_migrants = 2
+# 'ring' (each island sends to the next one) or 'full' (each island sends to all the others)
+migration_topology = 'ring'
+
+# If True, every length updated from a delta (e.g. by GA.mutate) is checked against a full recalculation. Slow, for debugging only.
+debug_delta_lengths = False
+
+# Progress output of a run: 'console' (a one line summary at most every report_interval seconds)
+# or 'quiet' (the final result only)
+report_mode = 'console'
+report_interval = 1.0
+
+# JSON Lines file receiving the metrics of a generation every metrics_interval seconds (see JSONLReporter).
+# None: no file
+metrics_path = None
+metrics_interval = 0.1
+
+# Maximum number of times per second the GUI redraws the routes (the solver sends no more snapshots than that)
+gui_frame_rate = 25
+
+# If True, every run times the phases of its generations (see PhaseProfiler) and prints a summary table at the end.
+# Profiling can also be switched on and off at any time with start_profiling() and stop_profiling().
+profile_phases = False
+# File receiving the cProfile statistics of GA_loop (read them with pstats), None: no cProfile
+profile_stats_path = None
+
+# File where runs save their state every checkpoint_interval seconds (and after the last generation),
+# to be continued with resume_run(). None: no checkpoints. Not available with the island model.
+checkpoint_path = None
+checkpoint_interval = 60.0
+
+# Seed for the random number generator (None for a different run every time)
+random_seed = None
+
 # Read city data from csv?
 csv_cities = False
 
 # Full path for csv file. The r prefix avoids any conflicts with backslashes.
 csv_name = 'cities.csv'
 
+# Coordinate instances whose distance matrix would take more than this many bytes get their distances
+# computed on demand instead (tsplib.CoordinateDistances). None: a quarter of the physical memory
+max_matrix_bytes = None
+# Number of distances the on-demand backend remembers (LRU cache)
+edge_cache_size = 2**20
+
+# Folder where load_instance() caches parsed instances and their distance matrices (None: no cache)
+instance_cache_dir = '.tsp_cache'
+
+# Random number generator shared by the whole algorithm
+rng = np.random.default_rng(random_seed)
+
 
 # City class
 class City(object):
@@ -64,58 +199,647 @@ class City(object):
     self.graph_x: x-coord for graphic representation
     self.graph_y: y-coord for graphic representation
     self.name: human readable name.
-    self.distance_to: dictionary of distances to other cities (keys are city names, values are floats)
+    self.index: position of the city in list_of_cities, used to address the shared dist_matrix
+    self.distance_to: row of dist_matrix with the distances to all other cities (indexed by city.index)
 
     """
-    def __init__(self, name, x, y, distance_to=None):
+    def __init__(self, name, x, y):
         # Name and coordinates:
         self.name = name
         self.x = self.graph_x = x
         self.y = self.graph_y = y
+        # Index of the city in the global list (and the row/column of the distance matrix):
+        self.index = len(list_of_cities)
         # Appends itself to the global list of cities:
         list_of_cities.append(self)
-        # Creates a dictionary of the distances to all the other cities (has to use a value so uses itself - always 0)
-        self.distance_to = {self.name:0.0}
-        if distance_to:
-            self.distance_to = distance_to
 
-    def calculate_distances(self): 
-        '''
-        self --> None
+    @property
+    def distance_to(self):
+        return dist_matrix[self.index]
+
+
+def set_distance_matrix(matrix, coords=None, edge_weight_type=None):
+    '''
+    array-like, array-like, str --> numpy.ndarray
+
+    Stores an (n x n) matrix of weights (or a tsplib.CoordinateDistances) as the shared
+    dist_matrix, and the (n x 2) city coordinates it was computed from with edge_weight_type,
+    if any. Integral weights are kept as int32.
+    '''
+    global dist_matrix, neighbor_lists, city_coords, distance_type, _fitness_memo
+    neighbor_lists = None
+    _fitness_memo = None
+    city_coords = None if coords is None else np.asarray(coords, dtype=np.float64)
+    distance_type = None if coords is None else edge_weight_type
+    if isinstance(matrix, tsplib.CoordinateDistances):
+        dist_matrix = matrix
+    else:
+        dist_matrix = tsplib.compact_weights(matrix)
+    return dist_matrix
+
+
+def matrix_memory_budget():
+    '''
+    None --> int
+
+    Largest distance matrix, in bytes, that is stored in full (see max_matrix_bytes).
+    '''
+    if max_matrix_bytes is not None:
+        return max_matrix_bytes
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 4
+    except (AttributeError, ValueError, OSError):
+        return 2**30
+
+
+def set_coordinates(coords, edge_weight_type):
+    '''
+    array (n x 2), str --> numpy.ndarray or tsplib.CoordinateDistances
+
+    Fills dist_matrix from city coordinates: the full matrix if it fits in
+    matrix_memory_budget(), a tsplib.CoordinateDistances otherwise.
+    '''
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    itemsize = 8 if edge_weight_type == 'EUC' else 4
+    if len(coords) ** 2 * itemsize <= matrix_memory_budget():
+        matrix = tsplib.distance_matrix(coords, edge_weight_type)
+    else:
+        matrix = tsplib.CoordinateDistances(coords, edge_weight_type, edge_cache_size)
+    return set_distance_matrix(matrix, coords, edge_weight_type)
+
+
+def calculate_distances():
+    '''
+    None --> numpy.ndarray
+
+    Calculates the euclidean distances between all the cities in the
+    global list_of_cities in one vectorized pass and stores them in dist_matrix.
+    '''
+    coords = np.array([(city.x, city.y) for city in list_of_cities], dtype=np.float64).reshape(-1, 2)
+    return set_coordinates(coords, 'EUC')
+
+
+def load_instance(path):
+    '''
+    str --> tsplib.TSPInstance
+
+    Reads a TSPLIB file (or one of the plain distance matrix files in data/) with the
+    tsplib module, creates one City per node and fills dist_matrix. With instance_cache_dir
+    set, the distance matrix of a file already seen is memory-mapped from the cache.
+    '''
+    if instance_cache_dir:
+        instance = tsplib.read_tsplib_cached(path, instance_cache_dir, matrix_memory_budget())
+    else:
+        instance = tsplib.read_tsplib(path)
+    if instance.coords is not None:
+        xy = instance.coords
+    elif instance.display_coords is not None:
+        xy = instance.display_coords
+    else:
+        xy = np.full((instance.dimension, 2), 10.0)
+    for i, (x, y) in enumerate(xy.tolist(), start=1):
+        City("C" + str(i), x, y)
+    if instance.weights is None:
+        set_coordinates(instance.coords, instance.edge_weight_type)
+    else:
+        set_distance_matrix(instance.weights, instance.coords, instance.edge_weight_type)
+    return instance
+
+
+def build_neighbor_lists(k=None):
+    '''
+    int --> numpy.ndarray
+
+    Finds the k (default k_neighbors) nearest cities of every city and stores them, nearest
+    first, in neighbor_lists. Cities with plane coordinates are looked up in a grid
+    (tsplib.nearest_neighbors(), O(n log n)); otherwise each row of dist_matrix is partially sorted.
+    '''
+    global neighbor_lists, _neighbor_lists_py
+    n = len(dist_matrix)
+    k = min(k or k_neighbors, n - 1)
+    _neighbor_lists_py = None
+    if city_coords is not None and distance_type in tsplib.PLANAR_WEIGHT_TYPES:
+        neighbor_lists = tsplib.nearest_neighbors(city_coords, k)
+        return neighbor_lists
+    neighbor_lists = np.empty((n, k), dtype=np.int32)
+    # works on blocks of rows to keep the temporary copies small
+    block = max(1, 2**22 // max(n, 1))
+    for start in range(0, n, block):
+        rows = np.arange(start, min(start + block, n))
+        dists = dist_matrix[rows].astype(np.float64)
+        dists[np.arange(len(rows)), rows] = np.inf
+        nearest = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(dists, nearest, axis=1), axis=1, kind='stable')
+        neighbor_lists[rows] = np.take_along_axis(nearest, order, axis=1)
+    return neighbor_lists
+
+
+def get_neighbor_lists():
+    '''
+    None --> (list, list)
+
+    Returns the candidate neighbours of every city and the distances to them as plain
+    Python lists (fast to walk in the local search loops), building them if needed.
+    '''
+    global _neighbor_lists_py
+    if neighbor_lists is None or len(neighbor_lists) != len(dist_matrix):
+        build_neighbor_lists()
+    if _neighbor_lists_py is None:
+        rows = np.arange(len(neighbor_lists))[:, None]
+        _neighbor_lists_py = (neighbor_lists.tolist(), dist_matrix[rows, neighbor_lists].tolist())
+    return _neighbor_lists_py
+
+
+def tour_length(tour):
+    '''
+    sequence of city indices --> float
+
+    Length of the closed tour visiting the cities in the given order, in O(n).
+    '''
+    tour = np.asarray(tour)
+    return float(dist_matrix[tour, np.roll(tour, -1)].sum(dtype=np.float64))
+
+
+def tour_lengths(tours):
+    '''
+    (pop_size x n) array of city indices --> numpy.ndarray
+
+    Lengths of many closed tours at once: a single gather on dist_matrix
+    over all the edges of all the tours, summed per row.
+    '''
+    tours = np.asarray(tours)
+    return dist_matrix[tours, np.roll(tours, -1, axis=1)].sum(axis=1, dtype=np.float64)
+
+
+def canonical_tour(tour):
+    '''
+    array of city indices --> numpy.ndarray
+
+    Writes a closed tour in a single way, in O(n): starting from city 0 and heading to the
+    smaller of its two neighbours. Two orderings are the same tour (up to rotation and
+    direction) exactly when their canonical forms are equal.
+    '''
+    tour = np.asarray(tour, dtype=np.int32)
+    canonical = np.roll(tour, -int(np.argmin(tour)))
+    if len(canonical) > 2 and canonical[-1] < canonical[1]:
+        canonical[1:] = canonical[:0:-1].copy()
+    return canonical
+
+
+def tour_keys(tours):
+    '''
+    (m x n) array of city indices --> list of bytes
+
+    The canonical_tour() of every row as bytes, computed for all the rows at once: a dict
+    or set key equal for orderings that are the same closed tour, whatever their rotation
+    and direction (and only for them: the whole tour is the key, not a hash of it).
+    '''
+    tours = np.asarray(tours, dtype=np.int32)
+    m, n = tours.shape
+    # each row rotated to start at city 0 is a slice of the row written twice
+    starts = np.argmin(tours, axis=1) + np.arange(m) * 2 * n
+    canonical = np.concatenate((tours, tours), axis=1).ravel()[starts[:, None] + np.arange(n)]
+    if n > 2:
+        backwards = np.flatnonzero(canonical[:, -1] < canonical[:, 1])
+        canonical[backwards, 1:] = canonical[backwards, :0:-1]
+    return [row.tobytes() for row in canonical]
+
+
+def tour_key(tour):
+    '''
+    array of city indices --> bytes
+
+    Same as tour_keys(), for one tour.
+    '''
+    return canonical_tour(tour).tobytes()
+
+
+class FitnessMemo(object):
+    """
+    Bounded memo of route lengths, by tour_keys() key. When full, the least recently
+    used length is dropped.
 
-        Calculates the distances of the
-        city to all other cities in the global 
-        list list_of_cities, and places these values 
-        in a dictionary called self.distance_to
-        with city name keys and float values
-        ''' 
-        for city in list_of_cities:
-            tmp_dist = self.point_dist(self.x, self.y, city.x, city.y)
-            self.distance_to[city.name] = tmp_dist
+    self.size: number of lengths kept - specified upon __init__
+    self.hits, self.misses: lookups answered by the memo, and routes that had to be evaluated
 
-    # Calculates the distance between two cartesian points..
-    def point_dist(self, x1,y1,x2,y2):
-        return ((x1-x2)**2 + (y1-y2)**2)**(0.5)
+    self.lengths(tours): Lengths of the tours, evaluating only the ones not in the memo.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lengths = OrderedDict()
+
+    def lengths(self, tours, keys=None):
+        '''
+        (m x n) array, list of bytes --> numpy.ndarray
+
+        Lengths of the tours (keys: their tour_keys(), if already known). The ones not in
+        the memo are evaluated in one go with tour_lengths() and remembered.
+        '''
+        if keys is None:
+            keys = tour_keys(tours)
+        lengths = np.empty(len(keys))
+        missing = []
+        for i, key in enumerate(keys):
+            length = self._lengths.get(key)
+            if length is None:
+                missing.append(i)
+            else:
+                self._lengths.move_to_end(key)
+                lengths[i] = length
+        if missing:
+            lengths[missing] = tour_lengths(np.asarray(tours)[missing])
+            for i in missing:
+                self._lengths[keys[i]] = lengths[i]
+            while len(self._lengths) > self.size:
+                self._lengths.popitem(last=False)
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        return lengths
+
+
+def get_fitness_memo():
+    '''
+    None --> FitnessMemo
+
+    The FitnessMemo of this process for the current instance, or None if fitness_memo_size is 0
+    or the distances are in a full matrix (a lookup then costs more than an evaluation).
+    '''
+    global _fitness_memo
+    if not fitness_memo_size or not isinstance(dist_matrix, tsplib.CoordinateDistances):
+        return None
+    if _fitness_memo is None or _fitness_memo.size != fitness_memo_size:
+        _fitness_memo = FitnessMemo(fitness_memo_size)
+    return _fitness_memo
+
+
+def swap_delta(tour, i, j):
+    '''
+    array of city indices, int, int --> float
+
+    Change in length of the closed tour if the cities at positions i and j were swapped.
+    Only the edges around the two positions are looked at, so it runs in O(1).
+    '''
+    n = len(tour)
+    if i > j:
+        i, j = j, i
+    if i == j:
+        return 0.0
+    if n <= 3:
+        # too short for the edges around i and j to be distinct
+        swapped = np.array(tour)
+        swapped[[i, j]] = swapped[[j, i]]
+        return tour_length(swapped) - tour_length(tour)
+    D = dist_matrix
+    if j - i == n - 1:
+        # first and last cities: ... d e | b c ... becomes ... d b | e c ...
+        b, c, d, e = tour[0], tour[1], tour[n-2], tour[n-1]
+        return float(D[d, b] + D[b, e] + D[e, c] - D[d, e] - D[e, b] - D[b, c])
+    a, b, c = tour[i-1], tour[i], tour[i+1]
+    d, e, f = tour[j-1], tour[j], tour[(j+1) % n]
+    if j - i == 1:
+        # neighbours: ... a b e f ... becomes ... a e b f ...
+        return float(D[a, e] + D[e, b] + D[b, f] - D[a, b] - D[b, e] - D[e, f])
+    return float(D[a, e] + D[e, c] + D[d, b] + D[b, f] - D[a, b] - D[b, c] - D[d, e] - D[e, f])
+
+
+def reverse_segment(tour, pos, i, j):
+    '''
+    list, list, int, int --> None
+
+    Reverses the cities at positions i..j (inclusive, wrapping around the end) of tour in place
+    and keeps pos (position of every city in tour) up to date. When the rest of the tour is
+    shorter it is reversed instead, which gives the same closed tour.
+    '''
+    n = len(tour)
+    length = (j - i) % n + 1
+    if 2 * length > n:
+        i, j = (j + 1) % n, (i - 1) % n
+        length = n - length
+    if i <= j:
+        tour[i:j+1] = tour[i:j+1][::-1]
+        for p in range(i, j + 1):
+            pos[tour[p]] = p
+    else:
+        for k in range(length // 2):
+            p, q = (i + k) % n, (j - k) % n
+            city_p, city_q = tour[p], tour[q]
+            tour[p] = city_q
+            pos[city_q] = p
+            tour[q] = city_p
+            pos[city_p] = q
+
+
+def apply_2opt_move(tour, pos, a, b, c, d):
+    '''
+    list, list, 4 cities --> None
+
+    Replaces the edges a-b and c-d of tour by a-c and b-d, where b follows a and d follows c
+    in the same direction along the tour (either forwards or backwards).
+    '''
+    if tour[(pos[a] + 1) % len(tour)] == b:
+        reverse_segment(tour, pos, pos[b], pos[c])
+    else:
+        reverse_segment(tour, pos, pos[c], pos[b])
+
+
+def swap_segments(tour, pos, a, b, c, d, e, f):
+    '''
+    list, list, 6 cities --> None
+
+    Turns a-b..c-d..e-f into a-d..e-b..c-f (the segments b..c and d..e trade places,
+    neither is reversed), as three consecutive 2-opt moves.
+    '''
+    apply_2opt_move(tour, pos, a, b, e, f)   # a-e..d-c..b-f
+    apply_2opt_move(tour, pos, a, e, d, c)   # a-d..e-c..b-f
+    apply_2opt_move(tour, pos, e, c, b, f)   # a-d..e-b..c-f
+
+
+def move_segment(tour, pos, p, s1, s2, q, x, y, end):
+    '''
+    list, list, 8 cities --> None
+
+    Moves the segment s1..s2 (p-s1..s2-q along the tour) between the neighbouring cities
+    x and y, so that x is joined to end (s1 or s2) and y to the other end of the segment.
+    '''
+    step = 1 if tour[(pos[p] + 1) % len(tour)] == s1 else -1
+    if tour[(pos[x] + step) % len(tour)] != y:
+        # walks x-y in the same direction as p-s1..s2-q
+        x, y = y, x
+        end = s1 if end == s2 else s2
+    if y == p:
+        # x-p-s1..s2-q: swapping p and the segment, reversed or not
+        if end == s1:
+            swap_segments(tour, pos, x, p, p, s1, s2, q)
+        else:
+            apply_2opt_move(tour, pos, x, p, s2, q)
+    elif end == s1:
+        # p-q..x-s1..s2-y
+        swap_segments(tour, pos, p, s1, s2, q, x, y)
+    else:
+        # p-q..x-s2..s1-y
+        apply_2opt_move(tour, pos, p, s1, x, y)
+        apply_2opt_move(tour, pos, p, x, q, s2)
+
+
+def nearest_neighbor_tour(start=None):
+    '''
+    int --> numpy.ndarray
+
+    Greedy nearest neighbour tour from start (a random city by default): always moves on
+    to the closest city not visited yet. The candidate neighbour lists answer almost every
+    step. When all of them are visited, the closest unvisited neighbour of a neighbour is
+    taken (nearly always as close), and only failing that are the remaining cities scanned.
+    '''
+    n = len(dist_matrix)
+    nbrs, _ = get_neighbor_lists()
+    current = int(rng.integers(n)) if start is None else start
+    # unvisited cities, packed at the front of remaining (removal swaps with the last one)
+    remaining = np.arange(n)
+    where = np.arange(n)
+    count = n
+    tour = np.empty(n, dtype=np.int32)
+    for step in range(n):
+        tour[step] = current
+        count -= 1
+        last = remaining[count]
+        remaining[where[current]] = last
+        where[last] = where[current]
+        where[current] = n
+        if count == 0:
+            break
+        for city in nbrs[current]:
+            if where[city] < n:
+                current = city
+                break
+        else:
+            candidates = [city for other in nbrs[current] for city in nbrs[other] if where[city] < n]
+            if not candidates:
+                candidates = remaining[:count]
+            current = int(candidates[np.argmin(dist_matrix[current, candidates])])
+    return tour
+
+
+def greedy_edge_tour(noise=0.0):
+    '''
+    float --> numpy.ndarray
+
+    Greedy matching tour: goes through the candidate edges (city to one of its neighbours)
+    from the shortest, and keeps every edge that neither gives a city a third edge nor closes
+    a cycle. The resulting paths are then chained, each one to the nearest free path end.
+    With noise > 0 the edge lengths are scaled by random factors up to 1 + noise before
+    sorting, so that repeated calls give different tours.
+    '''
+    n = len(dist_matrix)
+    get_neighbor_lists()
+    firsts = np.repeat(np.arange(n), neighbor_lists.shape[1])
+    seconds = neighbor_lists.ravel()
+    lengths = dist_matrix[firsts, seconds].astype(np.float64)
+    if noise:
+        lengths *= 1.0 + noise * rng.random(len(lengths))
+    order = np.argsort(lengths, kind='stable')
+
+    links = [[] for _ in range(n)]
+    parent = list(range(n))
+
+    def find(city):
+        while parent[city] != city:
+            parent[city] = parent[parent[city]]
+            city = parent[city]
+        return city
+
+    for a, b in zip(firsts[order].tolist(), seconds[order].tolist()):
+        if len(links[a]) < 2 and len(links[b]) < 2:
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[root_a] = root_b
+                links[a].append(b)
+                links[b].append(a)
+
+    # chains the paths: walks one to its other end, then jumps to the nearest free end
+    ends = np.array([city for city in range(n) if len(links[city]) < 2])
+    free = np.ones(len(ends), dtype=bool)
+    end_slot = dict((city, i) for i, city in enumerate(ends.tolist()))
+    tour = np.empty(n, dtype=np.int32)
+    step = 0
+    current = int(ends[rng.integers(len(ends))])
+    while True:
+        free[end_slot[current]] = False
+        previous = -1
+        while True:
+            tour[step] = current
+            step += 1
+            following = [city for city in links[current] if city != previous]
+            if not following:
+                break
+            previous, current = current, following[0]
+        free[end_slot[current]] = False
+        if step == n:
+            return tour
+        candidates = ends[free]
+        current = int(candidates[np.argmin(dist_matrix[current, candidates])])
+
+
+def space_filling_curve_tour(order=16):
+    '''
+    int --> numpy.ndarray
+
+    Visits the cities in the order of a Hilbert curve through the plane (on a 2**order grid),
+    which keeps close cities close in the tour, in one vectorized O(n log n) pass.
+    The curve is laid at a random angle, so every call gives a different tour.
+    Needs city_coords; instances without coordinates get a nearest neighbour tour instead.
+    '''
+    if city_coords is None:
+        return nearest_neighbor_tour()
+    angle = rng.uniform(0.0, 2 * math.pi)
+    rotation = np.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+    xy = city_coords.dot(rotation)
+    xy -= xy.min(axis=0)
+    side = 2**order
+    xy = (xy * ((side - 1) / max(float(xy.max()), 1e-300))).astype(np.int64)
+    x, y = xy[:, 0], xy[:, 1]
+    index = np.zeros(len(xy), dtype=np.int64)
+    s = side // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        index += s * s * ((3 * rx) ^ ry)
+        # rotates the quadrant so that the curve inside it has the standard orientation
+        flip = ~ry & rx
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s //= 2
+    return np.argsort(index, kind='stable').astype(np.int32)
+
+
+def random_insertion_tour():
+    '''
+    None --> numpy.ndarray
+
+    Inserts the cities in random order, each one where it lengthens the tour least next to
+    one of its candidate neighbours already in the tour (or, when none is in yet, next to the
+    closest city in the tour). The tour is kept as a linked list, so an insertion is O(k).
+    '''
+    n = len(dist_matrix)
+    nbrs, _ = get_neighbor_lists()
+    dist = dist_matrix.item
+    order = rng.permutation(n).tolist()
+    successor = [-1] * n
+    predecessor = [-1] * n
+    placed = np.empty(n, dtype=np.int64)
+    first = order[0]
+    successor[first] = predecessor[first] = first
+    placed[0] = first
+    for count, city in enumerate(order[1:], start=1):
+        best_cost, best_after = None, None
+        for other in nbrs[city]:
+            if successor[other] < 0:
+                continue
+            for after in (predecessor[other], other):
+                following = successor[after]
+                cost = dist(after, city) + dist(city, following) - dist(after, following)
+                if best_cost is None or cost < best_cost:
+                    best_cost, best_after = cost, after
+        if best_after is None:
+            in_tour = placed[:count]
+            best_after = int(in_tour[np.argmin(dist_matrix[city, in_tour])])
+        following = successor[best_after]
+        successor[best_after], predecessor[city] = city, best_after
+        successor[city], predecessor[following] = following, city
+        placed[count] = city
+
+    tour = np.empty(n, dtype=np.int32)
+    city = first
+    for i in range(n):
+        tour[i] = city
+        city = successor[city]
+    return tour
+
+
+def initial_tours(size):
+    '''
+    int --> numpy.ndarray
+
+    Builds size tours for a new population as a (size x n) int32 array: for every heuristic
+    of initial_population_mix, its share of the tours, and random tours for the rest.
+    '''
+    heuristics = {'nearest_neighbor': nearest_neighbor_tour,
+                  'greedy_edge': lambda: greedy_edge_tour(noise=0.1),
+                  'space_filling_curve': space_filling_curve_tour,
+                  'random_insertion': random_insertion_tour}
+    n = len(dist_matrix)
+    tours = np.empty((size, n), dtype=np.int32)
+    i = 0
+    for name, share in initial_population_mix.items():
+        for _ in range(min(int(round(share * size)), size - i)):
+            tours[i] = heuristics[name]()
+            i += 1
+    for j in range(i, size):
+        tours[j] = rng.permutation(n)
+    return tours
+
+
+def check_delta_length(route):
+    '''
+    Route() --> None
+
+    Debugging aid (see debug_delta_lengths): raises a ValueError if the length
+    kept up to date by delta evaluation differs from a full recalculation.
+    '''
+    full_length = tour_length(route.route)
+    if not np.isclose(route.length, full_length):
+        raise ValueError('Delta-evaluated length {0} differs from the recalculated {1}'.format(route.length, full_length))
 
 
 # Route Class
 class Route(object):
     """
-    Stores an ordered list of all the City objects in the global list_of_cities.
+    Stores an ordering of all the cities in the global list_of_cities as an int32 array of city indices.
     Also stores information about the route.
 
-    self.route: list of cities in list_of_cities. Randomly shuffled upon __init__
-    self.length: float length of route (full loop)
+    self.route: int32 permutation of the city indices. Randomly shuffled upon __init__ if no route is given
+    self.length: float length of route (full loop), NaN until measured
+
+    Routes that belong to a RoutePop are views: self.route is a row of RoutePop.routes
+    and self.length lives in RoutePop.lengths, so no data is copied.
 
     self.is_valid_route(): Returns True if the route contains all cities in list_of_cities ONCE and ONLY ONCE
     self.pr_cits_in_rt(): Prints all the cities in the route, in the form <cityname1,cityname2,cityname3...>
     self.pr_vrb_cits_in_rt: Prints all the coordinate pairs of the cities in the route, in the form <|x,y|x,y|x,y|...>
     """
-    def __init__(self):
+    __slots__ = ('route', '_length')
+
+    def __init__(self, route=None, evaluate=True):
         # initiates a route attribute equal to a randomly shuffled list_of_cities
-        self.route = sorted(list_of_cities, key=lambda *args: random.random())
-        ### Calculates its length:
-        self.recalc_rt_len()
+        if route is None:
+            route = rng.permutation(len(dist_matrix))
+        self.route = np.array(route, dtype=np.int32)
+        self._length = np.full(1, np.nan)
+        ### Calculates its length (skipped when the caller scores a whole population at once):
+        if evaluate:
+            self.recalc_rt_len()
+
+    @classmethod
+    def view(cls, route, length):
+        '''
+        int32 array, 1-element float array --> Route()
+
+        Wraps existing storage (a row of RoutePop.routes and a slice of RoutePop.lengths) without copying it.
+        '''
+        new_rt = cls.__new__(cls)
+        new_rt.route = route
+        new_rt._length = length
+        return new_rt
+
+    @property
+    def length(self):
+        return float(self._length[0])
+
+    @length.setter
+    def length(self, value):
+        self._length[0] = value
 
     def recalc_rt_len(self):
         '''
@@ -124,17 +848,7 @@ class Route(object):
         Method to re-calculate the route length
         if the self.route attribute has been changed manually.
         '''
-        # Zeroes its length
-        self.length = 0.0
-        # for every city in its route attribute:
-        for city in self.route:
-            # set up a next city variable that points to the next city in the list 
-            # and wraps around at the end:
-            next_city = self.route[self.route.index(city)-len(self.route)+1]
-            # Uses the first city's distance_to attribute to find the distance to the next city:
-            dist_to_next = city.distance_to[next_city.name]
-            # adds this length to its length attr.
-            self.length += dist_to_next
+        self.length = tour_length(self.route)
 
     def pr_cits_in_rt(self, print_route=False):
         '''
@@ -142,10 +856,7 @@ class Route(object):
 
         Prints all the cities in the route, in the form <cityname1,cityname2,cityname3...>
         '''
-        cities_str = ''
-        for city in self.route:
-            cities_str += city.name + ','
-        cities_str = cities_str[:-1] # chops off last comma
+        cities_str = ','.join([list_of_cities[i].name for i in self.route.tolist()])
         if print_route:
             print('    ' + cities_str)
 
@@ -155,10 +866,8 @@ class Route(object):
 
         Prints all the coordinate pairs of the cities in the route, in the form <|x,y|x,y|x,y|...>
         '''
-        cities_str = '|'
-        for city in self.route:
-            cities_str += str(city.x) + ',' + str(city.y) + '|'
-        print(cities_str)
+        cities = [list_of_cities[i] for i in self.route.tolist()]
+        print('|' + ''.join([str(city.x) + ',' + str(city.y) + '|' for city in cities]))
 
     def is_valid_route(self):
         '''
@@ -170,71 +879,333 @@ class Route(object):
         Use: if there are multiples of the same city in a route,
         it will converge until all the cities are that same city (length = 0)
         '''
-        for city in list_of_cities:
-            # helper function defined up to
-            if self.count_mult(self.route,lambda c: c.name == city.name) > 1:
-                return False
-        return True
-
-    # Returns the number of pred in sequence (duplicate checking.)
-    def count_mult(self, seq, pred):
-        return sum(1 for v in seq if pred(v))
+        n = len(list_of_cities)
+        if len(self.route) != n or self.route.min() < 0 or self.route.max() >= n:
+            return False
+        return bool((np.bincount(self.route, minlength=n) == 1).all())
 
 
 # Contains a population of Route() objects
 class RoutePop(object):
     """
-    Contains a list of route objects and provides info on them.
+    Contains a population of routes, stored contiguously, and provides info on them.
 
-    self.rt_pop: list of Route objects
-    self.size: lenth of rt_pop - specified upon __init__
+    self.routes: (size x n) int32 array, one route per row
+    self.lengths: numpy array with the cached length of every route
+    self.rt_pop: list of Route objects that are views over self.routes and self.lengths
+    self.size: number of routes - specified upon __init__
     self.fittest: Route() object with shortest length from self.rt_pop
 
-    self.get_fittest(): Calcualtes fittest route, sets self.fittest to it, and returns the Route. Use if routes have changed manually.
+    self.set_route(i, route): Copies a Route() into slot i of the population.
+    self.evaluate(): Scores every route in one vectorized call and refreshes self.lengths and self.fittest.
+    self.get_fittest(): Calcualtes fittest route from self.lengths, sets self.fittest to it, and returns the Route.
+    self.update_fittest(start, stop): Same, looking only at the slots start:stop that were just written.
+    RoutePop.view(routes, lengths): Returns a population over existing arrays, without copying them.
     """
     def __init__(self, size, initialise):
-        self.rt_pop = []
         self.size = size
+        n = len(dist_matrix)
+        self.routes = np.empty((size, n), dtype=np.int32)
+        self.lengths = np.full(size, np.nan)
+        self.rt_pop = [Route.view(self.routes[i], self.lengths[i:i+1]) for i in range(size)]
+        self.fittest = None
         # If we want to initialise a population.rt_pop:
         if initialise:
-            for x in range(0,size):
-                new_rt = Route()
-                self.rt_pop.append(new_rt)
-            self.get_fittest()
+            self.routes[:] = initial_tours(size)
+            self.evaluate()
+
+    @classmethod
+    def view(cls, routes, lengths):
+        '''
+        (size x n) int32 array, numpy array --> RoutePop()
+
+        Wraps existing storage (e.g. arrays in shared memory) without copying it. fittest is None.
+        '''
+        new_pop = cls.__new__(cls)
+        new_pop.size = len(routes)
+        new_pop.routes = routes
+        new_pop.lengths = lengths
+        new_pop.rt_pop = [Route.view(routes[i], lengths[i:i+1]) for i in range(new_pop.size)]
+        new_pop.fittest = None
+        return new_pop
+
+    def set_route(self, i, route):
+        '''
+        int, Route() --> None
+
+        Copies the order and the length of route into slot i.
+        '''
+        self.routes[i] = route.route
+        self.lengths[i] = route.length
+
+    def evaluate(self):
+        '''
+        self --> numpy.ndarray
+
+        Calculates the lengths of all the routes at once (one gather on dist_matrix
+        over the size x n route array), stores them in self.lengths and updates self.fittest.
+        Use if routes have changed manually.
+        '''
+        self.lengths[:] = tour_lengths(self.routes)
+        self.get_fittest()
+        return self.lengths
 
     def get_fittest(self):
         '''
         self --> Route()
 
-        Returns the two shortest routes in the population, in a list called self.top_two
+        Returns the shortest route in the population, using the cached self.lengths
         '''
-        # sorts the list based on the routes' lengths
-        sorted_list = sorted(self.rt_pop, key=lambda x: x.length, reverse=False)
-        self.fittest = sorted_list[0]
+        self.fittest = self.rt_pop[int(np.argmin(self.lengths))]
         return self.fittest
 
+    def update_fittest(self, start=0, stop=None):
+        '''
+        int, int --> Route()
+
+        Keeps self.fittest up to date after the slots start:stop were written, in O(stop - start):
+        only they are compared to the current fittest (None for a population being refilled).
+        '''
+        stop = self.size if stop is None else stop
+        if stop > start:
+            i = start + int(np.argmin(self.lengths[start:stop]))
+            if self.fittest is None or self.lengths[i] < self.fittest.length:
+                self.fittest = self.rt_pop[i]
+        return self.fittest
+
+
+class HallOfFame(object):
+    """
+    Keeps the size shortest distinct routes seen during a run, as compact arrays: one
+    canonical_tour() per row, so the same tour found twice (rotated or reversed) is kept once.
+
+    self.size: number of routes kept - specified upon __init__, at least 1 (the best route is always kept)
+    self.routes: (size x n) int32 array, the first len(self) rows are in use
+    self.lengths: numpy array with the length of every row (inf for unused rows)
+
+    self.add(route): Records a copy of route if it is among the size best, in O(n). Returns True if it was recorded.
+    self.best(): Returns a new Route() with the shortest route recorded.
+    self.ranked(): Returns new Route() objects for all the routes recorded, shortest first.
+    """
+    def __init__(self, size):
+        self.size = max(size, 1)
+        self.routes = np.empty((self.size, len(dist_matrix)), dtype=np.int32)
+        self.lengths = np.full(self.size, np.inf)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, route):
+        '''
+        Route() --> bool
+
+        Copies route into the hall of fame if it is shorter than the worst recorded one (or
+        there is room left) and not already in it. A longer route is turned away in O(size).
+        '''
+        length = route.length
+        full = self._count == self.size
+        worst = int(np.argmax(self.lengths))
+        if full and not length < self.lengths[worst]:
+            return False
+        tour = canonical_tour(route.route)
+        for i in np.flatnonzero(np.isclose(self.lengths, length)):
+            if np.array_equal(self.routes[i], tour):
+                return False
+        slot = worst if full else self._count
+        self.routes[slot] = tour
+        self.lengths[slot] = length
+        self._count = min(self._count + 1, self.size)
+        return True
+
+    def best(self):
+        '''
+        self --> Route()
+
+        Returns a copy of the shortest route recorded.
+        '''
+        return self.ranked()[0]
+
+    def ranked(self):
+        '''
+        self --> list of Route()
+
+        Returns copies of all the routes recorded, shortest first.
+        '''
+        ranked = []
+        for i in np.argsort(self.lengths[:self._count], kind='stable'):
+            route = Route(self.routes[i].copy(), evaluate=False)
+            route.length = self.lengths[i]
+            ranked.append(route)
+        return ranked
+
+
+class NullProfiler(object):
+    """
+    Profiler in place while profiling is off (see get_profiler()): its methods do nothing,
+    so the hot code pays a method call per phase and generation, nothing per route.
+    """
+    def mark(self):
+        return None
+
+    def add(self, name, mark):
+        return None
+
+    def end_generation(self):
+        pass
+
+
+class PhaseProfiler(NullProfiler):
+    """
+    Times the phases of each generation (selection, crossover, evaluation...). The code of a
+    phase takes a mark() before it and calls add(name, mark) after it, which returns the mark
+    of the next phase. The allocation counts are the net change of sys.getallocatedblocks():
+    the Python objects a phase leaves behind (NumPy buffers are not counted).
+
+    self.seconds: dict of the cumulative seconds of each phase
+    self.calls: dict of the number of calls of each phase
+    self.blocks: dict of the net number of blocks allocated by each phase
+    self.generations: list with a dict of the seconds of each phase for every finished generation
+    self.mark(): Returns the current (time, allocated blocks)
+    self.add(name, mark): Adds what happened since mark to phase name, returns a new mark
+    self.end_generation(): Closes the record of the current generation
+    self.summary(): Returns the timings as a table
+    """
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.blocks = {}
+        self.generations = []
+        self._generation = {}
+
+    def mark(self):
+        return time.perf_counter(), sys.getallocatedblocks()
+
+    def add(self, name, mark):
+        now = time.perf_counter(), sys.getallocatedblocks()
+        seconds = now[0] - mark[0]
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.blocks[name] = self.blocks.get(name, 0) + now[1] - mark[1]
+        self._generation[name] = self._generation.get(name, 0.0) + seconds
+        # the mark is taken again so that the bookkeeping isn't charged to the next phase
+        return time.perf_counter(), sys.getallocatedblocks()
+
+    def end_generation(self):
+        self.generations.append(self._generation)
+        self._generation = {}
+
+    def summary(self):
+        '''
+        self --> str
+
+        One line per phase, slowest first: calls, cumulative seconds, share of the profiled
+        time, mean milliseconds per generation and net allocated blocks per call.
+        '''
+        total = sum(self.seconds.values()) or 1.0
+        n_generations = max(len(self.generations), 1)
+        lines = ['{0:<20} {1:>8} {2:>10} {3:>7} {4:>12} {5:>12}'.format(
+            'phase', 'calls', 'total (s)', 'share', 'ms per gen', 'blocks/call')]
+        for name in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            lines.append('{0:<20} {1:>8} {2:>10.3f} {3:>7.1%} {4:>12.3f} {5:>12.1f}'.format(
+                name, self.calls[name], self.seconds[name], self.seconds[name] / total,
+                1000.0 * self.seconds[name] / n_generations, self.blocks[name] / float(self.calls[name])))
+        return '\n'.join(lines)
+
+
+# Profiler the phases of the generations report to (see get_profiler())
+_profiler = NullProfiler()
+
+
+def get_profiler():
+    '''
+    None --> NullProfiler or PhaseProfiler
+
+    The profiler the phases of a generation report to: the PhaseProfiler of start_profiling(),
+    or a NullProfiler (doing nothing) while profiling is off.
+    '''
+    return _profiler
+
+
+def start_profiling():
+    '''
+    None --> PhaseProfiler
+
+    Starts timing the phases of the generations with a new PhaseProfiler, and returns it.
+    Can be called at any time, including from another thread while a run is going on.
+    '''
+    global _profiler
+    _profiler = PhaseProfiler()
+    return _profiler
+
+
+def stop_profiling():
+    '''
+    None --> NullProfiler or PhaseProfiler
+
+    Stops timing the phases, returns the profiler that was timing them.
+    '''
+    global _profiler
+    profiler, _profiler = _profiler, NullProfiler()
+    return profiler
+
 
 # Class for bringing together all of the methods to do with the Genetic Algorithm
 class GA(object):
     """
-    Class for running the genetic algorithm. Do not __init__ - Class only provides methods. 
+    Class for running the genetic algorithm. Provides methods only; the optional arguments are
+    a process pool (see start_worker_pool()) that breeds the children in parallel, and the
+    SharedArrays (see share_instance()) the pool exchanges the parents and children through.
 
     crossover(parent1, parent2): Returns a child route after breeding the two parent routes. 
+    breed(parent_pop, children_pop, start): Fills children_pop from slot start on with bred, mutated children.
+    breed_selected(parent_routes, selected1, selected2, children_pop, start): Same, from parents already selected.
+    evolve_population(init_pop): Returns the next generation, written into a population buffer kept from the one before.
 
     """
+    def __init__(self, pool=None, shared=None):
+        self.pool = pool
+        self.shared = shared
+        # population buffer the next generation is written into (see evolve_population())
+        self._spare_pop = None
+        # preallocated arrays for breeding m children of n cities, see _workspace()
+        self._workspace_arrays = None
+
+    def _workspace(self, m, n):
+        '''
+        int, int --> dict
+
+        Scratch arrays for breeding and scoring m children of n cities, allocated on the
+        first generation and reused by all the following ones.
+        '''
+        ws = self._workspace_arrays
+        if ws is None or ws['parents1'].shape != (m, n) or ws['edges'].dtype != dist_matrix.dtype:
+            ws = self._workspace_arrays = {
+                'parents1': np.empty((m, n), dtype=np.int32),
+                'parents2': np.empty((m, n), dtype=np.int32),
+                'positions': np.arange(n),
+                'row_offsets': np.arange(m, dtype=np.int64)[:, None] * n,
+                'index': np.empty((m, n), dtype=np.int64),
+                'from_p1': np.empty((m, n), dtype=bool),
+                'gaps': np.empty((m, n), dtype=bool),
+                'in_child': np.empty((m, n), dtype=bool),
+                'taken': np.empty((m, n), dtype=bool),
+                'edges': np.empty((m, n), dtype=dist_matrix.dtype),
+            }
+        return ws
+
     def crossover_experimental(routeA,routeB):
         '''
             Experimental crossover algorithm using a spidering-out idea. Less effective at the moment.
         '''
-        # new child Route()
-        child_rt = Route()
-
+        route_a = routeA.route.tolist()
+        route_b = routeB.route.tolist()
 
         # prevents from recalculating
-        routeB_len = len(routeB.route)
+        routeB_len = len(route_b)
 
         # Chooses a random city
-        random_city = random.choice(list_of_cities)
+        random_city = int(rng.integers(len(list_of_cities)))
 
         # routeA going down
         # routeB going up
@@ -242,8 +1213,8 @@ class GA(object):
         incrementing_a = True
         incrementing_b = True
 
-        idx_a = routeA.route.index(random_city)
-        idx_b = routeB.route.index(random_city)
+        idx_a = route_a.index(random_city)
+        idx_b = route_b.index(random_city)
 
         idx_a -= 1
         idx_b += 1
@@ -254,16 +1225,13 @@ class GA(object):
         if idx_b >= routeB_len:
             incrementing_b = False
 
-        child_rt.route = [random_city]
-
-        # print(random_city.name)
+        child = [random_city]
 
         while (incrementing_a and incrementing_b):
-            # print('idx_a: {}'.format(idx_a))
 
             if idx_a >= 0:
-                if not (routeA.route[idx_a] in child_rt.route):
-                    child_rt.route.insert(0, routeA.route[idx_a])
+                if not (route_a[idx_a] in child):
+                    child.insert(0, route_a[idx_a])
 
             idx_a -= 1
 
@@ -271,12 +1239,9 @@ class GA(object):
                 incrementing_a = False
                 break
 
-            # child_rt.pr_cits_in_rt()
-
-
             if idx_b < routeB_len:
-                if not (routeB.route[idx_b] in child_rt.route):
-                    child_rt.route.append(routeB.route[idx_b])
+                if not (route_b[idx_b] in child):
+                    child.append(route_b[idx_b])
 
             idx_b += 1
 
@@ -284,23 +1249,28 @@ class GA(object):
                 incrementing_b = False
                 break
 
-            # print('idx_b: {}'.format(idx_b))
-            # child_rt.pr_cits_in_rt()
-
         # now either incrementing_a or incementing_b must be false
 
-        shuffled_cities = sorted(routeA.route, key=lambda *args: random.random())
-        for city in shuffled_cities:
-            if not city in child_rt.route:
-                child_rt.route.append(city)
+        for city in rng.permutation(route_a).tolist():
+            if not city in child:
+                child.append(city)
 
-        return child_rt
+        return Route(child, evaluate=False)
 
     def crossover(self, parent1, parent2):
         '''
         Route(), Route() --> Route()
 
-        Returns a child route Route() after breeding the two parent routes. 
+        Same as crossover_ox(), for Route() objects. The child is not measured (its length is NaN):
+        breed() scores all the children at once with GA.score().
+        '''
+        return Route(self.crossover_ox(parent1.route, parent2.route), evaluate=False)
+
+    def crossover_ox(self, parent1, parent2):
+        '''
+        array of city indices, array of city indices --> numpy.ndarray
+
+        Returns a child route after breeding the two parent routes (order crossover).
         Routes must be of same length.
 
         Breeding is done by selecting a random range of parent1, and placing it into the empty child route (in the same place).
@@ -316,106 +1286,580 @@ class GA(object):
             unfilled child: 01234*****
             filled child:   0123458796
 
-            * = None
+            * = unfilled
 
         '''
 
+        n = len(parent1)
 
+        # Two random integer indices of the parent1:
+        start_pos = int(rng.integers(n + 1))
+        end_pos = int(rng.integers(n + 1))
+        lo, hi = min(start_pos, end_pos), max(start_pos, end_pos)
+
+        # new child route, with the sub-route from parent one stuck in it (in the same place):
+        child = np.empty(n, dtype=np.int32)
+        child[lo:hi] = parent1[lo:hi]
+
+        # membership bitmap of the cities already in the child:
+        in_child = np.zeros(n, dtype=bool)
+        in_child[parent1[lo:hi]] = True
+
+        # the cities of parent2 the child doesn't have yet, in parent2's order, fill the
+        # gaps from left to right: first the slots before lo, then the ones after hi.
+        remaining = parent2[~in_child[parent2]]
+        child[:lo] = remaining[:lo]
+        child[hi:] = remaining[lo:]
+        return child
+
+    def crossover_batch(self, parents1, parents2, out=None):
+        '''
+        (m x n) array, (m x n) array --> (m x n) array
 
-        # new child Route()
-        child_rt = Route()
+        Same breeding as crossover_ox(), for m pairs of parents at once: row i of the result
+        is the child of parents1[i] and parents2[i]. Every row gets its own random range.
+        The children are written into out if given (e.g. a slice of RoutePop.routes).
+        All the (m x n) temporaries live in the preallocated workspace.
+        '''
+        m, n = parents1.shape
+        ws = self._workspace(m, n)
+        cuts = rng.integers(n + 1, size=(m, 2))
+        lo = cuts.min(axis=1)[:, None]
+        hi = cuts.max(axis=1)[:, None]
+        from_p1, gaps, in_child, taken, index = ws['from_p1'], ws['gaps'], ws['in_child'], ws['taken'], ws['index']
+
+        # positions of each child copied from parent1
+        np.greater_equal(ws['positions'], lo, out=from_p1)
+        np.less(ws['positions'], hi, out=gaps)
+        np.logical_and(from_p1, gaps, out=from_p1)
+        np.logical_not(from_p1, out=gaps)
+
+        # membership bitmap (one row per child) of the cities taken from parent1.
+        # Every row of parents1 holds every city once, so every cell gets written.
+        np.add(parents1, ws['row_offsets'], out=index)
+        np.put(in_child, index, from_p1)
+
+        if out is None:
+            out = np.empty((m, n), dtype=np.int32)
+        np.copyto(out, parents1, where=from_p1)
+        # The cities of parent2 missing from each child, row by row in parent2's order.
+        # Each row has as many gaps as missing cities, so every gap receives the next one.
+        np.add(parents2, ws['row_offsets'], out=index)
+        # (mode='clip' lets take() write straight into out; the indices are all valid anyway)
+        np.take(in_child, index, out=taken, mode='clip')
+        np.logical_not(taken, out=taken)
+        np.place(out, gaps, parents2[taken])
+        return out
+
+    def score(self, routes, out):
+        '''
+        (m x n) array, array of m floats --> array of m floats
 
-        for x in range(0,len(child_rt.route)):
-            child_rt.route[x] = None
+        Same as tour_lengths(), written into out and with the gather done in the preallocated
+        workspace (for a full distance matrix; distances computed on demand go through tour_lengths()).
+        '''
+        if not isinstance(dist_matrix, np.ndarray):
+            out[:] = tour_lengths(routes)
+            return out
+        m, n = routes.shape
+        ws = self._workspace(m, n)
+        index, edges = ws['index'], ws['edges']
+        # flat index of the edge from every city to the next one in its route
+        np.multiply(routes, n, out=index)
+        index[:, :-1] += routes[:, 1:]
+        index[:, -1] += routes[:, 0]
+        np.take(dist_matrix, index, out=edges, mode='clip')
+        edges.sum(axis=1, dtype=np.float64, out=out)
+        return out
+
+    def crossover_erx(self, parent1, parent2):
+        '''
+        array of city indices, array of city indices --> numpy.ndarray
 
-        # Two random integer indices of the parent1:
-        start_pos = random.randint(0,len(parent1.route))
-        end_pos = random.randint(0,len(parent1.route))
-
-
-        #### takes the sub-route from parent one and sticks it in itself:
-        # if the start position is before the end:
-        if start_pos < end_pos:
-            # do it in the start-->end order
-            for x in range(start_pos,end_pos):
-                child_rt.route[x] = parent1.route[x] # set the values to eachother
-        # if the start position is after the end:
-        elif start_pos > end_pos:
-            # do it in the end-->start order
-            for i in range(end_pos,start_pos):
-                child_rt.route[i] = parent1.route[i] # set the values to eachother
-
-
-        # Cycles through the parent2. And fills in the child_rt
-        # cycles through length of parent2:
-        for i in range(len(parent2.route)):
-            # if parent2 has a city that the child doesn't have yet:
-            if not parent2.route[i] in child_rt.route:
-                # it puts it in the first 'None' spot and breaks out of the loop.
-                for x in range(len(child_rt.route)):
-                    if child_rt.route[x] == None:
-                        child_rt.route[x] = parent2.route[i]
+        Edge recombination crossover, in O(n). Each city's candidates are its neighbours in
+        either parent. From a random city, the child moves on to a candidate linked to it in
+        both parents if there is one, otherwise to the candidate with the fewest candidates
+        left (so that few cities end up cut off), otherwise to a random unvisited city.
+        '''
+        a, b = parent1.tolist(), parent2.tolist()
+        n = len(a)
+        # candidates of every city, an edge of both parents appearing twice
+        links = [[] for _ in range(n)]
+        for tour in (a, b):
+            previous = tour[-1]
+            for city in tour:
+                links[previous].append(city)
+                links[city].append(previous)
+                previous = city
+
+        # unvisited cities, for the random jumps (removal swaps with the last one)
+        unvisited = list(range(n))
+        where = list(range(n))
+
+        child = np.empty(n, dtype=np.int32)
+        current = int(rng.integers(n))
+        for step in range(n):
+            child[step] = current
+            last = unvisited.pop()
+            if last != current:
+                unvisited[where[current]] = last
+                where[last] = where[current]
+            candidates = links[current]
+            for city in set(candidates):
+                links[city] = [other for other in links[city] if other != current]
+            if not unvisited:
+                break
+            if not candidates:
+                current = unvisited[int(rng.integers(len(unvisited)))]
+                continue
+            shared = [city for city in candidates if candidates.count(city) > 1]
+            if shared:
+                current = shared[0]
+            else:
+                current = min(candidates, key=lambda city: len(set(links[city])))
+        return child
+
+    def crossover_eax(self, parent1, parent2):
+        '''
+        array of city indices, array of city indices --> numpy.ndarray
+
+        Edge assembly crossover (Nagata's EAX, single AB-cycle strategy). The edges the parents
+        don't share are split into AB-cycles, closed walks alternating between an edge of parent1
+        and one of parent2. The child starts as parent1 with one AB-cycle applied: its parent1
+        edges are removed and its parent2 edges added. This leaves every city with two edges but
+        may split the tour into subtours, which are then joined, the smallest first, by the
+        cheapest exchange of two edges between it and a candidate neighbour. eax_trials
+        AB-cycles are tried and the shortest child is returned (parent1 itself if the parents
+        are the same tour).
+        '''
+        a, b = parent1.tolist(), parent2.tolist()
+        n = len(a)
+        a_links = [[a[i - 1], a[(i + 1) % n]] for i in range(n)]
+        a_links = [a_links[i] for i in np.argsort(parent1).tolist()]
+        b_links = [[b[i - 1], b[(i + 1) % n]] for i in range(n)]
+        b_links = [b_links[i] for i in np.argsort(parent2).tolist()]
+
+        # edges of one parent only, by city
+        a_only = [[city for city in a_links[c] if city not in b_links[c]] for c in range(n)]
+        b_only = [[city for city in b_links[c] if city not in a_links[c]] for c in range(n)]
+        cycles = self._ab_cycles(a_only, b_only)
+        if not cycles:
+            return parent1.copy()
+
+        dist = dist_matrix.item
+        best_child, best_delta = None, None
+        for i in rng.permutation(len(cycles))[:eax_trials].tolist():
+            links = [list(pair) for pair in a_links]
+            cycle = cycles[i]
+            delta = 0.0
+            # cycle[0]-cycle[1] is a parent1 edge, cycle[1]-cycle[2] a parent2 edge, and so on
+            for k in range(len(cycle)):
+                u, v = cycle[k], cycle[(k + 1) % len(cycle)]
+                if k % 2 == 0:
+                    links[u].remove(v)
+                    links[v].remove(u)
+                    delta -= dist(u, v)
+                else:
+                    links[u].append(v)
+                    links[v].append(u)
+                    delta += dist(u, v)
+            delta += self._join_subtours(links, cycle)
+            if best_delta is None or delta < best_delta:
+                best_child, best_delta = links, delta
+
+        # walks the child's links into a tour
+        child = np.empty(n, dtype=np.int32)
+        previous, current = -1, a[0]
+        for step in range(n):
+            child[step] = current
+            first, second = best_child[current]
+            previous, current = current, (second if first == previous else first)
+        return child
+
+    def _ab_cycles(self, a_only, b_only):
+        '''
+        list, list --> list of lists of cities
+
+        Splits the edges of a_only and b_only (lists of linked cities, by city, with as many
+        of each kind at every city) into AB-cycles, with random walks that take a_only and
+        b_only edges in turn. Whenever the walk comes back to a city it left by the other
+        kind of edge, the loop in between is an AB-cycle and is cut off. Consumes both lists.
+        '''
+        cycles = []
+        starts = [city for city in range(len(a_only)) if a_only[city]]
+        for start in starts:
+            while a_only[start]:
+                path = [start]
+                # index in path of every city, by the kind of edge it is left by (0: a, 1: b)
+                index = {(start, 0): 0}
+                while True:
+                    current = path[-1]
+                    kind = (len(path) - 1) % 2
+                    options = (a_only if kind == 0 else b_only)[current]
+                    following = options[int(rng.integers(len(options)))] if len(options) > 1 else options[0]
+                    options.remove(following)
+                    (a_only if kind == 0 else b_only)[following].remove(current)
+                    path.append(following)
+                    # arriving at following by one kind, the loop closes where it was left by the other
+                    j = index.get((following, 1 - kind))
+                    if j is None:
+                        index[(following, 1 - kind)] = len(path) - 1
+                        continue
+                    cycles.append(path[j:-1] if j % 2 == 0 else path[j + 1:-1] + [path[j]])
+                    for k in range(j + 1, len(path)):
+                        index.pop((path[k], k % 2), None)
+                    del path[j + 1:]
+                    if len(path) == 1:
                         break
-        # repeated until all the cities are in the child route
+        return cycles
 
-        # returns the child route (of type Route())
-        child_rt.recalc_rt_len()
-        return child_rt
+    def _join_subtours(self, links, touched):
+        '''
+        list, list --> float
+
+        Joins the subtours described by links (the two linked cities of every city) into one
+        tour, in place, and returns the change in length. Every subtour goes through one of
+        the touched cities. The smallest subtour is joined first, to the subtour with which
+        exchanging two edges costs least, looking at the candidate neighbours of its cities.
+        '''
+        n = len(links)
+        dist = dist_matrix.item
+        nbrs, _ = get_neighbor_lists()
+        subtour_of = [-1] * n
+        members = []
+        for start in touched:
+            if subtour_of[start] >= 0:
+                continue
+            cities = []
+            previous, current = -1, start
+            while subtour_of[current] < 0:
+                subtour_of[current] = len(members)
+                cities.append(current)
+                first, second = links[current]
+                previous, current = current, (second if first == previous else first)
+            members.append(cities)
+
+        delta = 0.0
+        alive = set(range(len(members)))
+        while len(alive) > 1:
+            smallest = min(alive, key=lambda s: len(members[s]))
+            best = None
+            for u in members[smallest]:
+                candidates = [v for v in nbrs[u] if subtour_of[v] != smallest]
+                if not candidates:
+                    continue
+                for u_next in set(links[u]):
+                    d_u = dist(u, u_next)
+                    for v in candidates:
+                        for v_next in set(links[v]):
+                            base = d_u + dist(v, v_next)
+                            cost = dist(u, v) + dist(u_next, v_next) - base
+                            if best is None or cost < best[0]:
+                                best = (cost, u, u_next, v, v_next)
+                            cost = dist(u, v_next) + dist(u_next, v) - base
+                            if cost < best[0]:
+                                best = (cost, u, u_next, v_next, v)
+            if best is None:
+                # none of its cities has a candidate neighbour outside it: tries them all
+                u, u_next = members[smallest][0], links[members[smallest][0]][0]
+                outside = [v for v in range(n) if subtour_of[v] != smallest]
+                v = outside[int(np.argmin([dist(u, city) for city in outside]))]
+                v_next = links[v][0]
+                best = (dist(u, v) + dist(u_next, v_next) - dist(u, u_next) - dist(v, v_next), u, u_next, v, v_next)
+            cost, u, u_next, v, v_next = best
+            # replaces u-u_next and the edge of v by u-v and u_next-v_next (v_next holds the other end)
+            links[u].remove(u_next)
+            links[u_next].remove(u)
+            links[v].remove(v_next)
+            links[v_next].remove(v)
+            links[u].append(v)
+            links[v].append(u)
+            links[u_next].append(v_next)
+            links[v_next].append(u_next)
+            delta += cost
+            target = subtour_of[v]
+            for city in members[smallest]:
+                subtour_of[city] = target
+            members[target].extend(members[smallest])
+            alive.discard(smallest)
+        return delta
 
     def mutate(self, route_to_mut):
         '''
         Route() --> Route()
 
         Swaps two random indexes in route_to_mut.route. Runs k_mut_prob*100 % of the time
+        The route must already be measured: its length is updated from the four edges that change.
         '''
         # k_mut_prob %
-        if random.random() < k_mut_prob:
+        if rng.random() < k_mut_prob:
 
             # two random indices:
-            mut_pos1 = random.randint(0,len(route_to_mut.route)-1)
-            mut_pos2 = random.randint(0,len(route_to_mut.route)-1)
+            mut_pos1 = int(rng.integers(len(route_to_mut.route)))
+            mut_pos2 = int(rng.integers(len(route_to_mut.route)))
 
             # if they're the same, skip to the chase
             if mut_pos1 == mut_pos2:
                 return route_to_mut
 
-            # Otherwise swap them:
+            # Otherwise update the length and swap them:
+            route_to_mut.length += swap_delta(route_to_mut.route, mut_pos1, mut_pos2)
+
             city1 = route_to_mut.route[mut_pos1]
             city2 = route_to_mut.route[mut_pos2]
 
             route_to_mut.route[mut_pos2] = city1
             route_to_mut.route[mut_pos1] = city2
 
-        # Recalculate the length of the route (updates it's .length)
-        route_to_mut.recalc_rt_len()
+            if debug_delta_lengths:
+                check_delta_length(route_to_mut)
 
         return route_to_mut
 
-    def mutate_2opt(route_to_mut):
+    def kick(self, route):
         '''
         Route() --> Route()
 
-        Swaps two random indexes in route_to_mut.route. Runs k_mut_prob*100 % of the time
+        Swaps two distinct random cities of route, always (see reject_duplicates).
+        The route must already be measured: its length is updated from the delta.
         '''
-        # k_mut_prob %
-        if random.random() < k_mut_prob:
+        n = len(route.route)
+        if n > 1:
+            i, j = (int(pos) for pos in rng.choice(n, 2, replace=False))
+            route.length += swap_delta(route.route, i, j)
+            route.route[[i, j]] = route.route[[j, i]]
+            if debug_delta_lengths:
+                check_delta_length(route)
+        return route
+
+    def reject_duplicates(self, population, max_kicks=10):
+        '''
+        RoutePop() --> int
 
-            for i in range(len(route_to_mut.route)):
-                for ii in range(len(route_to_mut.route)): # i is a, i + 1 is b, ii is c, ii+1 is d
-                    if (route_to_mut.route[i].distance_to[route_to_mut.route[i-len(route_to_mut.route)+1].name]
-                     + route_to_mut.route[ii].distance_to[route_to_mut.route[ii-len(route_to_mut.route)+1].name]
-                     > route_to_mut.route[i].distance_to[route_to_mut.route[ii].name]
-                     + route_to_mut.route[i-len(route_to_mut.route)+1].distance_to[route_to_mut.route[ii-len(route_to_mut.route)+1].name]):
+        Kicks (see kick()) every route that is the same tour as a route before it in the
+        population until it is unique, trying at most max_kicks times. The first copy, and so
+        the elite in slot 0, is kept as it is. Returns the number of duplicates found.
+        '''
+        seen = set()
+        duplicates = 0
+        for route, key in zip(population.rt_pop, tour_keys(population.routes)):
+            if key in seen:
+                duplicates += 1
+                for x in range(max_kicks):
+                    self.kick(route)
+                    key = tour_key(route.route)
+                    if key not in seen:
+                        break
+            seen.add(key)
+        return duplicates
 
-                        c_to_swap = route_to_mut.route[ii]
-                        b_to_swap = route_to_mut.route[i-len(route_to_mut.route)+1]
+    def mutate_or_opt(self, route_to_mut):
+        '''
+        Route() --> Route()
 
-                        route_to_mut.route[i-len(route_to_mut.route)+1] = c_to_swap
-                        route_to_mut.route[ii] = b_to_swap 
+        Moves a random segment of 1 to 3 cities next to one of the nearest neighbours of its
+        first city, on a random side of it. Runs k_mut_prob*100 % of the time.
+        The route must already be measured: its length is updated from the edges that change.
+        '''
+        n = len(route_to_mut.route)
+        if n < 8 or not rng.random() < k_mut_prob:
+            return route_to_mut
+
+        tour = route_to_mut.route.tolist()
+        pos = [0] * n
+        for p, city in enumerate(tour):
+            pos[city] = p
+        nbrs = get_neighbor_lists()[0]
+        dist = dist_matrix.item
+
+        start = int(rng.integers(n))
+        segment = [tour[(start + k) % n] for k in range(int(rng.integers(1, 4)))]
+        s1, s2 = segment[0], segment[-1]
+        p, q = tour[start - 1], tour[(pos[s2] + 1) % n]
+        x = nbrs[s1][int(rng.integers(len(nbrs[s1])))]
+        y = tour[(pos[x] + (1 if rng.random() < 0.5 else -1)) % n]
+        if x in segment or y in segment:
+            return route_to_mut
+
+        route_to_mut.length += (dist(x, s1) + dist(s2, y) + dist(p, q)
+                                - dist(p, s1) - dist(s2, q) - dist(x, y))
+        move_segment(tour, pos, p, s1, s2, q, x, y, s1)
+        route_to_mut.route[:] = tour
+        if debug_delta_lengths:
+            check_delta_length(route_to_mut)
+        return route_to_mut
 
-            route_to_mut.recalc_rt_len()
+    def improve_2opt(self, route):
+        '''
+        Route() --> Route()
 
-        return route_to_mut
+        2-opt local search: replaces two edges (a,b) and (c,d) by (a,c) and (b,d), reversing
+        the segment in between, for as long as that makes the route shorter. Removes crossings.
+
+        Only the nearest neighbours c of each city a are tried (get_neighbor_lists()), and the
+        search stops as soon as a-c is not shorter than the edge it would replace.
+        Assumes symmetric distances.
+        '''
+        return self._run_local_search(route, self._try_2opt_move, min_cities=5)
+
+    def improve_or_opt(self, route):
+        '''
+        Route() --> Route()
+
+        Or-opt local search: moves segments of 1 to 3 cities (in either direction) between two
+        other neighbouring cities, for as long as that makes the route shorter.
+
+        The segment is only inserted next to one of the nearest neighbours of its end cities.
+        Assumes symmetric distances.
+        '''
+        return self._run_local_search(route, self._try_or_opt_move, min_cities=8)
+
+    def improve_or_3opt(self, route):
+        '''
+        Route() --> Route()
+
+        Segment-insertion 3-opt ("or-3opt"): swaps two consecutive segments of any length,
+        a-b..c-d..e-f becoming a-d..e-b..c-f, without reversing either of them.
+
+        New edge a-d is taken from the nearest neighbours of a, e-b from those of b.
+        Assumes symmetric distances.
+        '''
+        return self._run_local_search(route, self._try_or_3opt_move, min_cities=6)
+
+    def local_search(self, route):
+        '''
+        Route() --> Route()
+
+        Runs the local search operators named in local_search_operators one after the other,
+        until a whole round of them can't shorten the route any more.
+        '''
+        operators = {'2opt': self.improve_2opt, 'or_opt': self.improve_or_opt, 'or_3opt': self.improve_or_3opt}
+        while True:
+            start_length = route.length
+            for name in local_search_operators:
+                operators[name](route)
+            if not route.length < start_length - 1e-9:
+                return route
+
+    def _run_local_search(self, route, try_move, min_cities):
+        '''
+        Route(), method, int --> Route()
+
+        Shared driver of the local search operators. Works on the route as a Python list
+        with a position array, and keeps a queue of cities to look at: try_move(a, ...) either
+        applies an improving move around city a and returns (delta, cities touched), or returns
+        None. Cities whose surroundings didn't change are not looked at again (don't-look bits:
+        only the cities at the ends of an applied move are put back in the queue).
+        The length of the (already measured) route is updated from the deltas.
+        '''
+        tour = route.route.tolist()
+        n = len(tour)
+        if n < min_cities:
+            return route
+        pos = [0] * n
+        for p, city in enumerate(tour):
+            pos[city] = p
+        nbrs, nbr_dists = get_neighbor_lists()
+        dist = dist_matrix.item
+
+        # cities still to look at. queued[city] == False is the city's don't-look bit
+        active = deque(tour)
+        queued = [True] * n
+        total_delta = 0.0
+        while active:
+            a = active.popleft()
+            queued[a] = False
+            move = try_move(a, tour, pos, nbrs, nbr_dists, dist)
+            if move is not None:
+                delta, touched = move
+                total_delta += delta
+                for city in touched:
+                    if not queued[city]:
+                        queued[city] = True
+                        active.append(city)
+
+        route.route[:] = tour
+        route.length += total_delta
+        if debug_delta_lengths:
+            check_delta_length(route)
+        return route
+
+    def _try_2opt_move(self, a, tour, pos, nbrs, nbr_dists, dist):
+        n = len(tour)
+        # tries the successor (a,b = next city) and then the predecessor (b = previous city) edge of a
+        for step in (1, -1):
+            b = tour[(pos[a] + step) % n]
+            d_ab = dist(a, b)
+            for c, d_ac in zip(nbrs[a], nbr_dists[a]):
+                if d_ac >= d_ab:
+                    break
+                d = tour[(pos[c] + step) % n]
+                if d == a:
+                    continue
+                delta = d_ac + dist(b, d) - d_ab - dist(c, d)
+                if delta < -1e-9:
+                    apply_2opt_move(tour, pos, a, b, c, d)
+                    return delta, (a, b, c, d)
+        return None
+
+    def _try_or_opt_move(self, a, tour, pos, nbrs, nbr_dists, dist):
+        n = len(tour)
+        # segments s1..s2 of 1 to 3 cities starting at a, going forwards and backwards
+        for step in (1, -1):
+            p = tour[(pos[a] - step) % n]
+            s1 = a
+            for seg_len in (1, 2, 3):
+                s2 = tour[(pos[a] + step * (seg_len - 1)) % n]
+                q = tour[(pos[s2] + step) % n]
+                removal_gain = dist(p, s1) + dist(s2, q) - dist(p, q)
+                if removal_gain <= 1e-9:
+                    continue
+                segment = [tour[(pos[a] + step * k) % n] for k in range(seg_len)]
+                # new edge s1-x or s2-x, with x one of the nearest neighbours of that end
+                for end, other_end in ((s1, s2), (s2, s1)):
+                    for x, d_end_x in zip(nbrs[end], nbr_dists[end]):
+                        if d_end_x >= removal_gain:
+                            break
+                        if x in segment:
+                            continue
+                        # x--end..other_end--y, y being either neighbour of x along the tour
+                        for y in (tour[(pos[x] + 1) % n], tour[(pos[x] - 1) % n]):
+                            if y in segment:
+                                continue
+                            delta = d_end_x + dist(other_end, y) - dist(x, y) - removal_gain
+                            if delta < -1e-9:
+                                move_segment(tour, pos, p, s1, s2, q, x, y, end)
+                                return delta, (p, s1, s2, q, x, y)
+        return None
+
+    def _try_or_3opt_move(self, a, tour, pos, nbrs, nbr_dists, dist):
+        n = len(tour)
+        pos_a = pos[a]
+        for step in (1, -1):
+            b = tour[(pos_a + step) % n]
+            d_ab = dist(a, b)
+            # new edge a-d, d further along the tour than b
+            for d, d_ad in zip(nbrs[a], nbr_dists[a]):
+                gain1 = d_ab - d_ad
+                if gain1 <= 1e-9:
+                    break
+                rel_d = (pos[d] - pos_a) * step % n
+                if rel_d < 2:
+                    continue
+                c = tour[(pos[d] - step) % n]
+                gain2 = gain1 + dist(c, d)
+                # new edge e-b, e in the segment d..(before a)
+                for e, d_be in zip(nbrs[b], nbr_dists[b]):
+                    if d_be >= gain2:
+                        break
+                    if (pos[e] - pos_a) * step % n < rel_d:
+                        continue
+                    f = tour[(pos[e] + step) % n]
+                    delta = dist(c, f) + d_be - dist(e, f) - gain2
+                    if delta < -1e-9:
+                        swap_segments(tour, pos, a, b, c, d, e, f)
+                        return delta, (a, b, c, d, e, f)
+        return None
 
     def tournament_select(self, population):
         '''
@@ -427,70 +1871,740 @@ class GA(object):
         Principle: gives worse Routes() a chance of succeeding, but favours good Routes()
         '''
 
-        # New smaller population (not intialised)
-        tournament_pop = RoutePop(size=tournament_size,initialise=False)
+        # fills the tournament with random individuals (can choose same twice)
+        entrants = rng.integers(population.size, size=tournament_size)
+
+        # returns the fittest (the routes already carry their cached length):
+        return population.rt_pop[int(entrants[np.argmin(population.lengths[entrants])])]
+
+    def select_parents(self, population, count):
+        '''
+        RoutePop(), int --> numpy array of count slot numbers
+
+        Selects count parents from population at once, with the scheme set by selection:
+        all the tournaments are drawn in one call and their winners found with one argmin,
+        and the rank based schemes draw from the linear ranking of the population.
+        '''
+        lengths = population.lengths
+        if selection == 'tournament':
+            entrants = rng.integers(population.size, size=(count, tournament_size))
+            return entrants[np.arange(count), np.argmin(lengths[entrants], axis=1)]
+
+        # linear ranking: the best route gets rank_pressure times the average probability
+        size = population.size
+        ranking = np.argsort(lengths, kind='stable')
+        weights = rank_pressure - (2.0 * rank_pressure - 2.0) * np.arange(size) / max(size - 1, 1)
+        probabilities = weights / weights.sum()
+        if selection == 'rank':
+            return ranking[rng.choice(size, count, p=probabilities)]
+        if selection == 'sus':
+            # count evenly spaced pointers from a single random offset, then shuffled into pairs
+            pointers = (rng.random() + np.arange(count)) / count
+            picks = np.minimum(np.searchsorted(np.cumsum(probabilities), pointers, side='right'), size - 1)
+            return ranking[rng.permutation(picks)]
+        raise ValueError('Unknown selection scheme {0}'.format(selection))
+
+    def breed(self, parent_pop, children_pop, start):
+        '''
+        RoutePop(), RoutePop(), int --> None
+
+        Fills the slots start.. of children_pop with the children of two parents selected
+        from parent_pop, scores them in one go, mutates them and, if local_search is 'all',
+        improves them with local search. children_pop.fittest is updated with them.
+        '''
+        profiler = get_profiler()
+        mark = profiler.mark()
 
-        # fills it with random individuals (can choose same twice)
-        for i in range(tournament_size-1):
-            tournament_pop.rt_pop.append(random.choice(population.rt_pop))
-        
-        # returns the fittest:
-        return tournament_pop.get_fittest()
+        # Selects two parents from the previous population for every child:
+        n_children = children_pop.size - start
+        selected1 = self.select_parents(parent_pop, n_children)
+        selected2 = self.select_parents(parent_pop, n_children)
+        profiler.add('selection', mark)
+        self.breed_selected(parent_pop.routes, selected1, selected2, children_pop, start)
+
+    def breed_selected(self, parent_routes, selected1, selected2, children_pop, start):
+        '''
+        (m x n) int32 array, numpy array, numpy array, RoutePop(), int --> None
+
+        The part of breed() after the selection: fills the slots start.. of children_pop with
+        the children of the parents parent_routes[selected1[i]] and parent_routes[selected2[i]].
+        '''
+        profiler = get_profiler()
+        mark = profiler.mark()
+        ws = self._workspace(len(selected1), parent_routes.shape[1])
+        parents1, parents2 = ws['parents1'], ws['parents2']
+        np.take(parent_routes, selected1, axis=0, out=parents1)
+        np.take(parent_routes, selected2, axis=0, out=parents2)
+
+        # Breeds the children straight into the population: all in one pass if the crossover
+        # has a batch version (the order crossover), else one pair of parents after the other
+        if crossover_operator not in crossover_operators:
+            raise ValueError('Unknown crossover operator {0}'.format(crossover_operator))
+        crossover, crossover_batch = crossover_operators[crossover_operator]
+        if crossover_batch is not None:
+            crossover_batch(self, parents1, parents2, out=children_pop.routes[start:])
+        else:
+            for x, child in enumerate(children_pop.routes[start:]):
+                child[:] = crossover(self, parents1[x], parents2[x])
+        mark = profiler.add('crossover', mark)
+
+        # Scores all the children in one go (skipping the ones already in the memo, if any)
+        memo = get_fitness_memo()
+        if memo is None:
+            self.score(children_pop.routes[start:], children_pop.lengths[start:])
+        else:
+            children_pop.lengths[start:] = memo.lengths(children_pop.routes[start:])
+        mark = profiler.add('evaluation', mark)
+
+        # Mutates the children (mutation with happen with a prob p = k_mut_prob)
+        mutate = self.mutate_or_opt if mutation_operator == 'or_opt' else self.mutate
+        for route in children_pop.rt_pop[start:]:
+            if rng.random() < 0.3:
+                mutate(route)
+        mark = profiler.add('mutation', mark)
+
+        # Memetic step: improves every child with local search
+        if local_search == 'all':
+            for route in children_pop.rt_pop[start:]:
+                self.local_search(route)
+            mark = profiler.add('local search', mark)
+
+        children_pop.update_fittest(start)
+        profiler.add('best tracking', mark)
+
+    def breed_parallel(self, parent_pop, children_pop, start):
+        '''
+        RoutePop(), RoutePop(), int --> None
+
+        Same as breed(), with the children split into n_workers chunks bred by the process pool.
+        The parents are selected here, then copied once into the shared memory the workers
+        attached when they started (self.shared); a worker only receives the slot numbers of the
+        parents of its chunk, and writes its children into the shared children arrays. Every chunk
+        gets its own random stream, seeded from this generation's draw of rng and the chunk
+        number, so the outcome doesn't depend on which worker happens to run which chunk.
+        '''
+        profiler = get_profiler()
+        mark = profiler.mark()
+        n_children = children_pop.size - start
+        selected1 = self.select_parents(parent_pop, n_children)
+        selected2 = self.select_parents(parent_pop, n_children)
+        mark = profiler.add('selection', mark)
+
+        arrays = self.shared.arrays
+        arrays['parent_routes'][:] = parent_pop.routes
+        base_seed = int(rng.integers(2**63))
+        bounds = np.linspace(0, n_children, n_workers + 1).astype(int)
+        futures = [self.pool.submit(_breed_chunk, selected1[a:b], selected2[a:b], start + a, start + b, (base_seed, i))
+                   for i, (a, b) in enumerate(zip(bounds[:-1], bounds[1:])) if b > a]
+        for future in futures:
+            future.result()
+        children_pop.routes[start:] = arrays['child_routes'][start:]
+        children_pop.lengths[start:] = arrays['child_lengths'][start:]
+        children_pop.update_fittest(start)
+        profiler.add('breeding (workers)', mark)
 
     def evolve_population(self, init_pop):
         '''
         RoutePop() --> RoutePop()
 
         Takes a population and evolves it then returns the new population. 
+
+        Double buffered: the new population is written into the population given to the
+        previous call, and init_pop becomes the buffer for the next call. So after a call,
+        the routes of the population before init_pop must not be used any more (copy them).
         '''
 
-        #makes a new population:
-        descendant_pop = RoutePop(size=init_pop.size, initialise=True)
+        profiler = get_profiler()
+        mark = profiler.mark()
+
+        # takes the spare population buffer, and keeps init_pop as the next one
+        descendant_pop = self._spare_pop
+        if (descendant_pop is None or descendant_pop is init_pop
+                or descendant_pop.routes.shape != init_pop.routes.shape):
+            descendant_pop = RoutePop(size=init_pop.size, initialise=False)
+        self._spare_pop = init_pop
 
         # Elitism offset (amount of Routes() carried over to new population)
         elitismOffset = 0
 
+        # the fittest is tracked as the slots are filled
+        descendant_pop.fittest = None
+
         # if we have elitism, set the first of the new population to the fittest of the old
         if elitism:
-            descendant_pop.rt_pop[0] = init_pop.fittest
+            descendant_pop.set_route(0, init_pop.fittest)
+            descendant_pop.update_fittest(0, 1)
             elitismOffset = 1
+        profiler.add('elitism', mark)
 
-        # Goes through the new population and fills it with the child of two tournament winners from the previous populatio
-        for x in range(elitismOffset,descendant_pop.size):
-            # two parents:
-            tournament_parent1 = self.tournament_select(init_pop)
-            tournament_parent2 = self.tournament_select(init_pop)
+        # Fills the rest of the new population with children of the old one
+        if self.pool is None:
+            self.breed(init_pop, descendant_pop, elitismOffset)
+        else:
+            self.breed_parallel(init_pop, descendant_pop, elitismOffset)
+
+        # Gives the copies of a route already in the population a tour of their own
+        # (the kicks change lengths anywhere in the population, so the fittest is looked for again)
+        if reject_duplicates:
+            mark = profiler.mark()
+            if self.reject_duplicates(descendant_pop):
+                descendant_pop.get_fittest()
+            profiler.add('duplicates', mark)
+
+        # Memetic step for the fittest route only (see breed() for the 'all' case).
+        # It only makes the route shorter, so it stays the fittest.
+        if local_search == 'elite':
+            mark = profiler.mark()
+            self.local_search(descendant_pop.fittest)
+            profiler.add('local search', mark)
 
-            # A child:
-            tournament_child = self.crossover(tournament_parent1, tournament_parent2)
+        return descendant_pop
 
-            # Fill the population up with children
-            descendant_pop.rt_pop[x] = tournament_child
 
-        # Mutates all the routes (mutation with happen with a prob p = k_mut_prob)
-        for route in descendant_pop.rt_pop:
-            if random.random() < 0.3:
-                self.mutate(route)
 
-        # Update the fittest route:
-        descendant_pop.get_fittest()
 
-        return descendant_pop
 
 
+# Crossovers by crossover_operator name: (crossover, batch). crossover breeds one child from two
+# parent arrays of city indices, GA.crossover_ox(parent1, parent2) --> child. batch, if not None,
+# breeds all the pairs of a generation at once, GA.crossover_batch(parents1, parents2, out).
+crossover_operators = {'ox': (GA.crossover_ox, GA.crossover_batch),
+                       'erx': (GA.crossover_erx, None),
+                       'eax': (GA.crossover_eax, None)}
+
+
+# Module level parameters the worker processes need to breed like this one
+_worker_parameters = ('crossover_operator', 'eax_trials', 'k_mut_prob', 'mutation_operator', 'selection',
+                      'tournament_size', 'rank_pressure', 'elitism', 'k_neighbors', 'local_search',
+                      'local_search_operators', 'debug_delta_lengths', 'initial_population_mix',
+                      'fitness_memo_size', 'reject_duplicates')
+
+
+class SharedArrays(object):
+    """
+    Publishes NumPy arrays once in multiprocessing.shared_memory blocks, so that worker
+    processes can attach them (attach_shared_arrays()) without copying or pickling them.
+
+    self.spec: small picklable description (block name, shape, dtype) of every array, for the workers
+    self.arrays: the published copies, backed by the shared memory
+
+    self.close(): Removes the blocks. Also runs at exit, and if the process is killed the
+    multiprocessing resource tracker removes them.
+    """
+    def __init__(self, arrays):
+        self.spec = {}
+        self.arrays = {}
+        self._blocks = []
+        atexit.register(self.close)
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self._blocks.append(block)
+            self.arrays[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            self.arrays[name][...] = array
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        '''
+        self --> None
+
+        Releases and removes the shared memory blocks.
+        '''
+        # the views have to go before their buffers can be released
+        self.arrays = {}
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Shared memory blocks attached by this (worker) process, kept open for as long as it runs
+_attached_blocks = []
+# The arrays a worker process attached, by name (see _init_worker())
+_shared_arrays = None
+
+
+def attach_shared_arrays(spec):
+    '''
+    dict --> dict
+
+    Maps the arrays described by SharedArrays.spec into this process, zero-copy.
+    '''
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _attached_blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return arrays
+
+
+def share_instance(pop_size=0):
+    '''
+    int --> SharedArrays
+
+    Publishes dist_matrix, the city coordinates and (if the run uses them) the neighbour
+    lists in shared memory for the worker and island processes. Distances computed on
+    demand are not published: the workers compute them from the shared coordinates.
+    With a pop_size, also allocates the arrays GA.breed_parallel() hands the parents to
+    the worker pool and gets the children back through.
+    '''
+    if local_search or mutation_operator == 'or_opt' or initial_population_mix or crossover_operator == 'eax':
+        get_neighbor_lists()
+    arrays = {}
+    if isinstance(dist_matrix, np.ndarray):
+        arrays['dist_matrix'] = dist_matrix
+    if city_coords is not None:
+        arrays['city_coords'] = city_coords
+    if neighbor_lists is not None:
+        arrays['neighbor_lists'] = neighbor_lists
+    if pop_size:
+        arrays['parent_routes'] = np.zeros((pop_size, len(dist_matrix)), dtype=np.int32)
+        arrays['child_routes'] = np.zeros((pop_size, len(dist_matrix)), dtype=np.int32)
+        arrays['child_lengths'] = np.zeros(pop_size)
+    return SharedArrays(arrays)
+
+
+def start_worker_pool(shared):
+    '''
+    SharedArrays --> concurrent.futures.ProcessPoolExecutor
+
+    Starts n_workers processes for GA.breed_parallel(). Each worker attaches the shared
+    instance and takes over the parameters once, when it starts.
+    '''
+    return ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                               initargs=(shared.spec, _worker_parameter_values()))
+
+
+def _worker_parameter_values():
+    # the parameters, plus how to rebuild distances computed on demand
+    parameters = dict((name, globals()[name]) for name in _worker_parameters)
+    if not isinstance(dist_matrix, np.ndarray):
+        parameters['_on_demand_distances'] = (dist_matrix.edge_weight_type, dist_matrix.cache_size)
+    return parameters
+
+
+def _init_worker(spec, parameters):
+    global dist_matrix, neighbor_lists, city_coords, _neighbor_lists_py, _shared_arrays
+    arrays = _shared_arrays = attach_shared_arrays(spec)
+    city_coords = arrays.get('city_coords')
+    if 'dist_matrix' in arrays:
+        dist_matrix = arrays['dist_matrix']
+    else:
+        edge_weight_type, cache_size = parameters.pop('_on_demand_distances')
+        dist_matrix = tsplib.CoordinateDistances(city_coords, edge_weight_type, cache_size)
+    neighbor_lists = arrays.get('neighbor_lists')
+    _neighbor_lists_py = None
+    globals().update(parameters)
+
+
+def _breed_chunk(selected1, selected2, start, stop, seed):
+    '''
+    Runs in a worker process: breeds the children start:stop of the shared children arrays
+    from the shared parent routes selected1 and selected2, with a random stream of its own.
+    '''
+    global rng
+    rng = np.random.default_rng(seed)
+    children_pop = RoutePop.view(_shared_arrays['child_routes'][start:stop], _shared_arrays['child_lengths'][start:stop])
+    GA().breed_selected(_shared_arrays['parent_routes'], selected1, selected2, children_pop, 0)
+
+
+class Islands(object):
+    """
+    Island model: n_islands populations, each evolved by GA.evolve_population() in its own process.
+    Every migration_interval generations, the n_migrants best routes of every island are copied to
+    its neighbours (migration_topology), replacing their worst routes. Each island keeps its own elitism.
+
+    self.size: number of islands
+    self.fittest: Route() object, the shortest route of the latest generation over all islands
+    self.island_lengths: the shortest length of every island in the latest generation
+
+    self.evolve(): Evolves every island by one generation (and migrates when it is time to).
+    self.close(): Stops the island processes.
+    """
+    def __init__(self, size, pop_size, shared):
+        self.size = size
+        self.generation = 0
+        self.fittest = None
+        self.island_lengths = np.zeros(size)
+        self._immigrants = [None] * size
+        parameters = _worker_parameter_values()
+        seeds = np.random.SeedSequence(int(rng.integers(2**63))).spawn(size)
+        self._conns = []
+        self._processes = []
+        for i in range(size):
+            conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_island_worker, daemon=True,
+                                              args=(child_conn, shared.spec, parameters, pop_size, seeds[i]))
+            process.start()
+            child_conn.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+        try:
+            self._receive()
+        except BaseException:
+            self.close()
+            raise
+
+    def evolve(self):
+        '''
+        self --> Islands()
+
+        Runs one generation on every island in parallel, then migrates every migration_interval generations.
+        '''
+        for conn, immigrants in zip(self._conns, self._immigrants):
+            conn.send(immigrants)
+        self._immigrants = [None] * self.size
+        emigrants = self._receive()
+        self.generation += 1
+        if self.generation % migration_interval == 0:
+            for i in range(self.size):
+                if migration_topology == 'full':
+                    sources = [j for j in range(self.size) if j != i]
+                else:
+                    sources = [(i - 1) % self.size]
+                self._immigrants[i] = (np.concatenate([emigrants[j][0] for j in sources]),
+                                       np.concatenate([emigrants[j][1] for j in sources]))
+        return self
+
+    def _receive(self):
+        # collects the best routes of every island and updates self.fittest
+        emigrants = [conn.recv() for conn in self._conns]
+        self.island_lengths = np.array([lengths[0] for routes, lengths in emigrants])
+        best = int(np.argmin(self.island_lengths))
+        self.fittest = Route(emigrants[best][0][0], evaluate=False)
+        self.fittest.length = emigrants[best][1][0]
+        return emigrants
+
+    def close(self):
+        '''
+        self --> None
+
+        Stops the island processes.
+        '''
+        for conn in self._conns:
+            try:
+                conn.send('stop')
+            except OSError:
+                pass  # the island process has already stopped (after an error)
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._conns = []
+        self._processes = []
+
+
+def _island_worker(conn, spec, parameters, pop_size, seed):
+    '''
+    Runs in an island process: evolves one population one generation per message received
+    (a tuple of immigrant routes and lengths, or None), answering with copies of its n_migrants
+    best routes and their lengths, until it receives 'stop'.
+    '''
+    global rng
+    _init_worker(spec, parameters)
+    rng = np.random.default_rng(seed)
+    population = RoutePop(pop_size, True)
+    ga = GA()
+    while True:
+        best = np.argsort(population.lengths, kind='stable')[:n_migrants]
+        conn.send((population.routes[best], population.lengths[best]))
+        message = conn.recv()
+        if message == 'stop':
+            break
+        if message is not None:
+            # the immigrants replace the worst routes (never the elite)
+            routes, lengths = message
+            worst = np.argsort(population.lengths, kind='stable')[::-1][:min(len(routes), population.size - 1)]
+            population.routes[worst] = routes[:len(worst)]
+            population.lengths[worst] = lengths[:len(worst)]
+            population.get_fittest()
+        population = ga.evolve_population(population)
+    conn.close()
+
+
+def generation_metrics(generation, population, best_route, elapsed):
+    '''
+    int, RoutePop() or Islands(), Route(), float --> dict
+
+    Metrics of a generation, as reported: the best length so far, the length of the current
+    fittest, the mean length and the diversity (share of distinct tours) of the population,
+    and the generations per second so far. With the island model the mean is taken over the
+    fittest routes of the islands, and the diversity is None.
+    '''
+    if isinstance(population, RoutePop):
+        mean_length = float(population.lengths.mean())
+        diversity = len(set(tour_keys(population.routes))) / float(population.size)
+    else:
+        mean_length = float(population.island_lengths.mean())
+        diversity = None
+    return {'generation': generation,
+            'best_length': float(best_route.length),
+            'current_length': float(population.fittest.length),
+            'mean_length': mean_length,
+            'diversity': diversity,
+            'gens_per_sec': generation / elapsed if elapsed > 0 else None,
+            'elapsed': elapsed}
+
+
+class Reporter(object):
+    """
+    Receives the progress of a run from App.GA_loop(). The methods do nothing here,
+    subclasses override the ones they need.
+
+    self.start(n_generations): Called before the first generation.
+    self.generation(generation, population, best_route, elapsed): Called after every generation, with
+        the RoutePop() (or Islands()) of the generation, only valid during the call, and the best route so far.
+    self.finish(best_route, elapsed): Called once the run is over, with the final best route.
+    """
+    def start(self, n_generations):
+        pass
+
+    def generation(self, generation, population, best_route, elapsed):
+        pass
+
+    def finish(self, best_route, elapsed):
+        pass
+
+
+class IntervalReporter(Reporter):
+    """
+    Base of the reporters that output a generation at most every interval seconds (and the
+    first and last generations), so that their cost doesn't grow with the number of generations.
+
+    self.interval: minimum number of seconds between two outputs
+    self.n_generations: number of generations of the run
+    self.due(generation, elapsed): Returns True if generation is to be output (and counts it as output)
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.n_generations = None
+        self._last_output = None
+
+    def start(self, n_generations):
+        self.n_generations = n_generations
+        self._last_output = None
+
+    def due(self, generation, elapsed):
+        last = generation >= self.n_generations - 1
+        if self._last_output is not None and elapsed - self._last_output < self.interval and not last:
+            return False
+        self._last_output = elapsed
+        return True
+
+
+class ConsoleReporter(IntervalReporter):
+    """
+    Prints a one line summary of the run at most every interval seconds, and for the last
+    generation, so that the output doesn't grow with the number of generations or cities.
+    """
+    def __init__(self, interval=1.0):
+        IntervalReporter.__init__(self, interval)
+
+    def generation(self, generation, population, best_route, elapsed):
+        if not self.due(generation, elapsed):
+            return
+        metrics = generation_metrics(generation, population, best_route, elapsed)
+        line = 'Generation {0} of {1} ({2:.1f}/s): best {3:.2f}, current {4:.2f}, mean {5:.2f}'.format(
+            generation, self.n_generations, metrics['gens_per_sec'] or 0.0, metrics['best_length'],
+            metrics['current_length'], metrics['mean_length'])
+        if metrics['diversity'] is not None:
+            line += ', {0:.0%} distinct'.format(metrics['diversity'])
+        print(line)
+
+
+class JSONLReporter(IntervalReporter):
+    """
+    Writes the generation_metrics() of a generation at most every interval seconds (and of the
+    first and last generations) to a JSON Lines file, one JSON object per line, for plotting
+    or comparing runs.
+
+    self.path: path of the file, overwritten when the run starts
+    """
+    def __init__(self, path, interval=0.1):
+        IntervalReporter.__init__(self, interval)
+        self.path = path
+        self._file = None
+
+    def start(self, n_generations):
+        IntervalReporter.start(self, n_generations)
+        self._file = open(self.path, 'w')
 
+    def generation(self, generation, population, best_route, elapsed):
+        if not self.due(generation, elapsed):
+            return
+        self._file.write(json.dumps(generation_metrics(generation, population, best_route, elapsed)) + '\n')
 
+    def finish(self, best_route, elapsed):
+        self._file.close()
+        self._file = None
+
+
+class GUIReporter(Reporter):
+    """
+    Sends snapshots of the run to the GUI, which runs in another thread: at most frame_rate
+    per second, each one a copy of the current fittest tour and, when it has changed, of the
+    best tour so far. The GUI takes them from self.snapshots with App.poll_snapshots().
+
+    self.snapshots: queue of (generation, current tour or None, best tour or None, best length, done, error) tuples,
+        error being the exception that stopped the run (see App.run_solver()), or None
+    self.frame_rate: maximum number of snapshots per second
+    self.initial_length: best length of the first reported generation
+    """
+    def __init__(self, frame_rate=25):
+        self.snapshots = queue.Queue()
+        self.frame_rate = frame_rate
+        self.initial_length = None
+        self._last_frame = None
+        self._sent_best_length = None
+
+    def start(self, n_generations):
+        self.initial_length = None
+        self._last_frame = None
+        self._sent_best_length = None
+
+    def generation(self, generation, population, best_route, elapsed):
+        if self.initial_length is None:
+            self.initial_length = best_route.length
+        if self._last_frame is not None and elapsed - self._last_frame < 1.0 / self.frame_rate:
+            return
+        self._last_frame = elapsed
+        best = None
+        if best_route.length != self._sent_best_length:
+            best = best_route.route.copy()
+            self._sent_best_length = best_route.length
+        self.snapshots.put((generation, population.fittest.route.copy(), best, best_route.length, False, None))
+
+    def finish(self, best_route, elapsed):
+        # the best route can have been polished in place after the last generation
+        self.snapshots.put((None, None, best_route.route.copy(), best_route.length, True, None))
+
+
+def default_reporters():
+    '''
+    None --> list of Reporter()
+
+    The reporters asked for by report_mode and metrics_path.
+    '''
+    reporters = []
+    if report_mode == 'console':
+        reporters.append(ConsoleReporter(report_interval))
+    if metrics_path:
+        reporters.append(JSONLReporter(metrics_path, metrics_interval))
+    return reporters
+
+
+# Version of the checkpoint files, raised when their contents change
+_CHECKPOINT_VERSION = 2
+
+# Parameters saved in the checkpoints and restored on resume, besides _worker_parameters
+_checkpoint_parameters = _worker_parameters + ('hall_of_fame_size', 'polish_best_route', 'n_workers', 'random_seed')
+
+
+class Checkpointer(object):
+    """
+    Saves the state of a run (see App.checkpoint_state()) to an .npz file every interval seconds.
+    The arrays are copied in the GA thread, which takes a few milliseconds even for a 1000 x 2392
+    population, and written by a background thread to a temporary file that then replaces the
+    checkpoint, so a crash in the middle of a write leaves the previous checkpoint intact.
+
+    self.path: path of the checkpoint file
+    self.interval: minimum number of seconds between two checkpoints
+    self.due(): Returns True if interval seconds have passed since the last checkpoint
+    self.save(state): Starts writing state (a dict of arrays, not modified afterwards) in the background
+    self.wait(): Waits for the write in progress, if any, and raises the exception it failed with
+    """
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self._last_save = time.time()
+        self._writer = None
+        self._error = None
+
+    def due(self):
+        return time.time() - self._last_save >= self.interval
+
+    def save(self, state):
+        # one write at a time: the next checkpoint waits for the previous one to be on disk
+        self.wait()
+        self._last_save = time.time()
+        self._writer = threading.Thread(target=self._write, args=(state,))
+        self._writer.start()
+
+    def _write(self, state):
+        # an exception would only be printed by the thread: kept for wait() to raise it in the GA thread
+        try:
+            save_checkpoint(self.path, state)
+        except Exception as e:
+            self._error = e
+
+    def wait(self):
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+def save_checkpoint(path, state):
+    '''
+    str, dict --> None
+
+    Writes the arrays of state to path as an uncompressed .npz file, atomically: to a
+    temporary file first, flushed to the disk, which then replaces path. So after a crash
+    path holds either the previous checkpoint or the new one, complete.
+    '''
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **state)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    # the rename is only on the disk once the folder is too (folders can't be opened on Windows)
+    if hasattr(os, 'O_DIRECTORY'):
+        folder = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(folder)
+        finally:
+            os.close(folder)
+
+
+def load_checkpoint(path):
+    '''
+    str --> dict
+
+    Reads a checkpoint written by save_checkpoint(): its arrays, and its metadata (generation,
+    parameters, random generator state...) decoded into state['meta'].
+    '''
+    with np.load(path, allow_pickle=False) as data:
+        state = {name: data[name] for name in data.files}
+    state['meta'] = json.loads(str(state['meta']))
+    if state['meta'].get('version') != _CHECKPOINT_VERSION:
+        raise ValueError('{0} is not a checkpoint of this version'.format(path))
+    return state
 
 
 class App(object):
     """
     Runs the application
     """
-    def __init__(self,n_generations,pop_size, graph=False):
+    def __init__(self,n_generations,pop_size, graph=False, reporters=None, resume_from=None):
         '''
-        Initiates an App object to run for n_generations with a population of size pop_size
+        Initiates an App object to run for n_generations with a population of size pop_size.
+        reporters: list of Reporter() objects following the run (default_reporters() if None)
+        resume_from: checkpoint to continue the run from (see resume_run())
         '''
 
+        self.reporters = default_reporters() if reporters is None else reporters
+        self.resume_from = resume_from
+
         if csv_cities:
             self.read_csv()
 
@@ -498,10 +2612,10 @@ class App(object):
         self.pop_size = pop_size
 
         # Once all the cities are defined, calcualtes the distances for all of them.
-        # for city in list_of_cities:
-        #     city.calculate_distances()
+        # calculate_distances()
         if graph:
             self.set_city_gcoords()
+            self.graph_xy = np.array([(city.graph_x, city.graph_y) for city in list_of_cities])
             
             # Initiates a window object & sets its title
             self.window = Tk()
@@ -524,6 +2638,10 @@ class App(object):
                 self.canvas_current.create_oval(city.graph_x-2, city.graph_y-2, city.graph_x + 2, city.graph_y + 2, fill='blue')
                 self.canvas_best.create_oval(city.graph_x-2, city.graph_y-2, city.graph_x + 2, city.graph_y + 2, fill='blue')
 
+            # one polyline per canvas for the routes, moved in place by update_canvas()
+            self.path_current = self.canvas_current.create_line(0, 0, 0, 0, fill='red')
+            self.path_best = self.canvas_best.create_line(0, 0, 0, 0, fill='green')
+
             # Packs all the widgets (physically creates them and places them in order)
             self.canvas_current_title.pack()
             self.canvas_current.pack()
@@ -532,10 +2650,10 @@ class App(object):
             self.status_label.pack(side=BOTTOM, fill=X)
 
             # Runs the main window loop
-            self.window_loop(graph)
+            self.window_loop()
         else:
             print("Calculating GA_loop")
-            self.GA_loop(n_generations,pop_size, graph=graph)
+            self.GA_loop(n_generations,pop_size)
 
     def set_city_gcoords(self):
         '''
@@ -598,31 +2716,50 @@ class App(object):
             city.graph_y = 300 - (city.graph_y * stretch)
 
 
-    def update_canvas(self,the_canvas,the_route,color):
+    def update_canvas(self,the_canvas,path,tour):
         '''
-        Convenience method to update the canvases with the new routes
-        '''
-
-        # deletes all current items with tag 'path'
-        the_canvas.delete('path')
+        Canvas, int, np.ndarray --> None
 
-        # loops through the route
-        for i in range(len(the_route.route)):
-
-            # similar to i+1 but will loop around at the end
-            next_i = i-len(the_route.route)+1
+        Moves the polyline path of the_canvas onto tour (closed back to its first city), in a single call
+        '''
+        the_canvas.coords(path, self.graph_xy[np.append(tour, tour[0])].ravel().tolist())
 
-            # creates the line from city to city
-            the_canvas.create_line(the_route.route[i].graph_x,
-                                the_route.route[i].graph_y,
-                                the_route.route[next_i].graph_x,
-                                the_route.route[next_i].graph_y,
-                                tags=("path"),
-                                fill=color)
+    def poll_snapshots(self, reporter):
+        '''
+        GUIReporter() --> None
 
-            # Packs and updates the canvas
-            the_canvas.pack()
-            the_canvas.update_idletasks()
+        Draws the latest snapshot sent by the solver thread, and polls again after one frame until the run is done.
+        Only this method touches the widgets: Tk must be used from the thread that runs mainloop().
+        '''
+        generation = current = best = error = None
+        done = False
+        while True:
+            try:
+                snapshot = reporter.snapshots.get_nowait()
+            except queue.Empty:
+                break
+            # keeps the latest of each part: older snapshots are not worth drawing
+            generation = snapshot[0] if snapshot[0] is not None else generation
+            current = snapshot[1] if snapshot[1] is not None else current
+            if snapshot[2] is not None:
+                best, best_length = snapshot[2], snapshot[3]
+            done = done or snapshot[4]
+            error = snapshot[5] if snapshot[5] is not None else error
+
+        if current is not None:
+            self.update_canvas(self.canvas_current, self.path_current, current)
+        if best is not None:
+            self.update_canvas(self.canvas_best, self.path_best, best)
+            self.stat_tk_txt.set('Initial length {0:.2f} Best length = {1:.2f}'.format(reporter.initial_length, best_length))
+        if error is not None:
+            self.stat_tk_txt.set('The run stopped with an error: {0}'.format(error))
+            return
+        if done:
+            self.window.wm_title("Generation {0}".format(self.n_generations))
+            return
+        if generation is not None:
+            self.window.wm_title("Generation {0}".format(generation))
+        self.window.after(max(1, int(1000 / reporter.frame_rate)), self.poll_snapshots, reporter)
 
     def read_csv(self):
         with open(csv_name, 'rt') as f:
@@ -630,107 +2767,243 @@ class App(object):
             for row in reader:
                 new_city = City(row[0],float(row[1]),float(row[2]))
 
-    def GA_loop(self,n_generations,pop_size, graph=False):
+    def GA_loop(self,n_generations,pop_size):
         '''
         Main logic loop for the GA. Creates and manages populations, running variables etc.
+        Never touches the GUI, which follows the run through a GUIReporter(), so it can run in a thread of its own.
         '''
 
         # takes the time to measure the elapsed time
         start_time = time.time()
 
-        # Creates the population:
-        print("Creates the population:")
-        the_population = RoutePop(pop_size, True)
-        print ("Finished Creation of the population")
-
-        # the_population.rt_pop[0].route = [1,8,38,31,44,18,7,28,6,37,19,27,17,43,30,36,46,33,20,47,21,32,39,48,5,42,24,10,45,35,4,26,2,29,34,41,16,22,3,23,14,25,13,11,12,15,40,9]
-        # the_population.rt_pop[0].recalc_rt_len()
-        # the_population.get_fittest()
-
-        #checks to make sure there are no duplicate cities:
-        if the_population.fittest.is_valid_route() == False:
-            raise NameError('Multiple cities with same name. Check cities.')
-            return # if there are, raise a NameError and return
-
-        # gets the best length from the first population (no practical use, just out of interest to see improvements)
-        initial_length = the_population.fittest.length
-
-        # Creates a random route called best_route. It will store our overall best route.
-        best_route = Route()
-
-        if graph:
-            # Update the two canvases with the just-created routes:
-            self.update_canvas(self.canvas_current,the_population.fittest,'red')
-            self.update_canvas(self.canvas_best,best_route,'green')
-
-
-        # Main process loop (for number of generations)
-        for x in range(1,n_generations):
-            # Updates the current canvas every n generations (to avoid it lagging out, increase n)
-            if x % 8 == 0 and graph:
-                self.update_canvas(self.canvas_current,the_population.fittest,'red')
-
-            # Evolves the population:
-            the_population = GA().evolve_population(the_population)
-
-            # If we have found a new shorter route, save it to best_route
-            if the_population.fittest.length < best_route.length:
-                # set the route (copy.deepcopy because the_population.fittest is persistent in this loop so will cause reference bugs)
-                best_route = copy.deepcopy(the_population.fittest)
-                if graph:
-                    # Update the second canvas because we have a new best route:
-                    self.update_canvas(self.canvas_best,best_route,'green')
-                    # update the status bar (bottom bar)
-                    self.stat_tk_txt.set('Initial length {0:.2f} Best length = {1:.2f}'.format(initial_length,best_route.length))
-                    self.status_label.pack()
-                    self.status_label.update_idletasks()
-
-            # Prints info to the terminal:
-            self.clear_term()
-            print('Generation {0} of {1}'.format(x,n_generations))
-            print(' ')
-            print('Overall fittest has length {0:.2f}'.format(best_route.length))
-            print('and goes via:')
-            best_route.pr_cits_in_rt(True)
-            print(' ')
-            print('Current fittest has length {0:.2f}'.format(the_population.fittest.length))
-            print('And goes via:')
-            the_population.fittest.pr_cits_in_rt(True)
-            print(' ')
-            print('''The screen with the maps may become unresponsive if the population size is too large. It will refresh at the end.''')
-
-            if graph:
-                # sets the window title to the latest Generation:
-                self.window.wm_title("Generation {0}".format(x))
-        if graph:
-            # sets the window title to the last generation
-            self.window.wm_title("Generation {0}".format(n_generations))
+        # A resumed run takes back the parameters it was started with
+        checkpoint = load_checkpoint(self.resume_from) if self.resume_from else None
+        if checkpoint is not None:
+            globals().update(checkpoint['meta']['parameters'])
+
+        if n_islands > 1 and (checkpoint_path or checkpoint is not None):
+            raise ValueError('Checkpoints are not available with the island model')
+        checkpointer = Checkpointer(checkpoint_path, checkpoint_interval) if checkpoint_path else None
+
+        # Optional profiling: phase timings (profile_phases) and cProfile statistics (profile_stats_path)
+        if profile_phases:
+            start_profiling()
+        stats = cProfile.Profile() if profile_stats_path else None
+        if stats is not None:
+            stats.enable()
+
+        # From here on, the worker processes, the islands and the shared memory blocks are released
+        # and the profiling stops however the run ends (see the finally clause)
+        shared = pool = the_population = None
+        try:
+            # Publishes the distances once, in shared memory, for the worker or island processes
+            # (and the arrays the worker pool breeds through, see GA.breed_parallel())
+            breeding_pool = n_workers > 1 and n_islands == 1
+            if breeding_pool or n_islands > 1:
+                shared = share_instance(pop_size if breeding_pool else 0)
+
+            # Creates the population (or the islands, each with a population of its own),
+            # or takes it from the checkpoint the run continues from:
+            first_generation = 1
+            if checkpoint is not None:
+                the_population, hall_of_fame, initial_length, first_generation = self.restore_checkpoint(checkpoint, pop_size)
+                # the time of the earlier sessions counts, so that generations per second stay right
+                start_time -= checkpoint['meta']['elapsed']
+            elif n_islands > 1:
+                the_population = Islands(n_islands, pop_size, shared)
+            else:
+                the_population = RoutePop(pop_size, True)
+
+            # the_population.rt_pop[0].route = [1,8,38,31,44,18,7,28,6,37,19,27,17,43,30,36,46,33,20,47,21,32,39,48,5,42,24,10,45,35,4,26,2,29,34,41,16,22,3,23,14,25,13,11,12,15,40,9]
+            # the_population.rt_pop[0].recalc_rt_len()
+            # the_population.get_fittest()
+
+            #checks to make sure there are no duplicate cities:
+            if the_population.fittest.is_valid_route() == False:
+                raise NameError('Multiple cities with same name. Check cities.')
+                return # if there are, raise a NameError and return
+
+            if checkpoint is None:
+                # gets the best length from the first population (no practical use, just out of interest to see improvements)
+                initial_length = the_population.fittest.length
+
+                # Keeps the best distinct routes found over the whole run; best_route is a copy of the best one.
+                hall_of_fame = HallOfFame(hall_of_fame_size)
+                hall_of_fame.add(the_population.fittest)
+            best_route = hall_of_fame.best()
+
+            # Breeds in n_workers processes if asked to (the islands already have a process each)
+            pool = start_worker_pool(shared) if breeding_pool else None
+            ga = GA(pool, shared)
+
+            # Reports the initial population as generation 0 (or the generation the run continues from)
+            for reporter in self.reporters:
+                reporter.start(n_generations)
+                reporter.generation(first_generation - 1, the_population, best_route, time.time() - start_time)
+
+            # Main process loop (for number of generations)
+            x = first_generation - 1
+            for x in range(first_generation,n_generations):
+                profiler = get_profiler()
+
+                # Evolves the population:
+                if n_islands > 1:
+                    mark = profiler.mark()
+                    the_population.evolve()
+                    profiler.add('islands', mark)
+                else:
+                    the_population = ga.evolve_population(the_population)
+
+                # If we have found a new shorter route, save it to best_route
+                # (the hall of fame keeps a copy: the population's routes are overwritten by the next generations)
+                mark = profiler.mark()
+                if hall_of_fame.add(the_population.fittest) and the_population.fittest.length < best_route.length:
+                    best_route = hall_of_fame.best()
+                mark = profiler.add('best tracking', mark)
+
+                # Reports the progress (the reporters decide how often they actually output something)
+                for reporter in self.reporters:
+                    reporter.generation(x, the_population, best_route, time.time() - start_time)
+                profiler.add('reporting', mark)
+
+                if checkpointer is not None and checkpointer.due():
+                    mark = profiler.mark()
+                    checkpointer.save(self.checkpoint_state(x, n_generations, the_population, hall_of_fame, initial_length,
+                                                             time.time() - start_time))
+                    profiler.add('checkpoint', mark)
+                profiler.end_generation()
+
+            # The last checkpoint holds the final population, so that the run can be extended
+            if checkpointer is not None:
+                checkpointer.save(self.checkpoint_state(x, n_generations, the_population, hall_of_fame, initial_length,
+                                                             time.time() - start_time))
+                checkpointer.wait()
+
+            # Improves the best route found with local search
+            evolved_length = best_route.length
+            if polish_best_route:
+                GA().local_search(best_route)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            if isinstance(the_population, Islands):
+                the_population.close()
+            if shared is not None:
+                shared.close()
+            if stats is not None:
+                stats.disable()
+            phases = stop_profiling() if profile_phases else None
 
-            # updates the best route canvas for the last time:
-            self.update_canvas(self.canvas_best,best_route,'green')
-            
         # takes the end time of the run:
         end_time = time.time()
+        if stats is not None:
+            stats.dump_stats(profile_stats_path)
+        for reporter in self.reporters:
+            reporter.finish(best_route, end_time - start_time)
 
         # Prints final output to terminal:
-        self.clear_term()
+        print(' ')
         print('Finished evolving {0} generations.'.format(n_generations))
         print("Elapsed time was {0:.1f} seconds.".format(end_time - start_time))
         print(' ')
         print('Initial best distance: {0:.2f}'.format(initial_length))
+        if polish_best_route:
+            print('Evolved best distance: {0:.2f}'.format(evolved_length))
         print('Final best distance:   {0:.2f}'.format(best_route.length))
-        print('The best route went via:')
-        best_route.pr_cits_in_rt(print_route=True)
+        if report_mode != 'quiet':
+            print('The best route went via:')
+            best_route.pr_cits_in_rt(print_route=True)
+        if phases is not None:
+            print(' ')
+            print(phases.summary())
 
-    def window_loop(self, graph):
+    def checkpoint_state(self, generation, n_generations, population, hall_of_fame, initial_length, elapsed):
         '''
-        Wraps the GA_loop() method and initiates the window on top of the logic.
-        window.mainloop() hogs the Thread, that's why the GA_loop is called as a callback
+        int, int, RoutePop(), HallOfFame(), float, float --> dict
+
+        Copies everything the run needs to continue after generation: the population, the hall of
+        fame, the random generator state, the parameters and the seconds the run has taken so far,
+        as arrays for save_checkpoint().
+        '''
+        fittest = next(i for i, route in enumerate(population.rt_pop) if route is population.fittest)
+        meta = {'version': _CHECKPOINT_VERSION,
+                'generation': generation,
+                'n_generations': n_generations,
+                'pop_size': population.size,
+                'n_cities': len(dist_matrix),
+                'fittest': fittest,
+                'initial_length': float(initial_length),
+                'elapsed': elapsed,
+                'rng_state': rng.bit_generator.state,
+                'parameters': {name: globals()[name] for name in _checkpoint_parameters}}
+        return {'meta': np.array(json.dumps(meta)),
+                'routes': population.routes.copy(),
+                'lengths': population.lengths.copy(),
+                'hall_of_fame_routes': hall_of_fame.routes[:len(hall_of_fame)].copy(),
+                'hall_of_fame_lengths': hall_of_fame.lengths[:len(hall_of_fame)].copy()}
+
+    def restore_checkpoint(self, state, pop_size):
+        '''
+        dict, int --> RoutePop(), HallOfFame(), float, int
+
+        Rebuilds the population, the hall of fame and the random generator of a run from a
+        load_checkpoint() state (GA_loop() has already set the parameters it ran with).
+        Returns them with the initial length and the first generation left to run.
+        '''
+        global rng
+        meta = state['meta']
+        if meta['n_cities'] != len(dist_matrix) or meta['pop_size'] != pop_size:
+            raise ValueError('The checkpoint is for {0} cities and a population of {1}, not {2} and {3}'.format(
+                meta['n_cities'], meta['pop_size'], len(dist_matrix), pop_size))
+
+        population = RoutePop(pop_size, False)
+        population.routes[:] = state['routes']
+        population.lengths[:] = state['lengths']
+        population.fittest = population.rt_pop[meta['fittest']]
+        if not np.isclose(tour_length(population.fittest.route), population.fittest.length):
+            raise ValueError('The checkpoint is for another instance')
+
+        hall_of_fame = HallOfFame(meta['parameters']['hall_of_fame_size'])
+        count = len(state['hall_of_fame_lengths'])
+        hall_of_fame.routes[:count] = state['hall_of_fame_routes']
+        hall_of_fame.lengths[:count] = state['hall_of_fame_lengths']
+        hall_of_fame._count = count
+
+        rng = np.random.default_rng()
+        rng.bit_generator.state = meta['rng_state']
+        return population, hall_of_fame, meta['initial_length'], meta['generation'] + 1
+
+    def window_loop(self):
+        '''
+        Runs the GA_loop() method in a background thread and the window in this one.
+        window.mainloop() hogs the Thread, so the window follows the run by polling the snapshots
+        of a GUIReporter() with window.after(), and stays responsive while the GA is searching.
         '''
         # see http://stackoverflow.com/questions/459083/how-do-you-run-your-own-code-alongside-tkinters-event-loop
-        self.window.after(0,self.GA_loop(self.n_generations, self.pop_size, graph))
+        reporter = GUIReporter(gui_frame_rate)
+        self.reporters = self.reporters + [reporter]
+        solver = threading.Thread(target=self.run_solver, args=(reporter,), daemon=True)
+        solver.start()
+        self.window.after(0, self.poll_snapshots, reporter)
         self.window.mainloop()
 
+    def run_solver(self, reporter):
+        '''
+        GUIReporter() --> None
+
+        Target of the solver thread: runs GA_loop() and always ends with a done snapshot, which carries
+        the exception if the run failed, so that the window stops polling and shows the error.
+        The exception is raised again, for its traceback to reach the terminal.
+        '''
+        error = None
+        try:
+            self.GA_loop(self.n_generations, self.pop_size)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            reporter.snapshots.put((None, None, None, None, True, error))
+
     # Helper function for clearing terminal window
     def clear_term(self):
         os.system('cls' if os.name=='nt' else 'clear')
@@ -754,30 +3027,27 @@ class App(object):
 # j = City('c2', 1, 22)
 # k = City('c3', 2, 13)
 
-def specific_cities2():
+def resume_run(path, n_generations=None, graph=False):
+    '''
+    str, int, bool --> App()
+
+    Continues the run saved in checkpoint path, up to n_generations (by default the number the
+    run was started for), exactly as it would have gone on without the interruption. The instance
+    the run was on must be loaded first.
+    '''
+    meta = load_checkpoint(path)['meta']
+    if n_generations is None:
+        n_generations = meta['n_generations']
+    return App(n_generations, meta['pop_size'], graph=graph, resume_from=path)
+
+
+def specific_cities2(path="data/pr2392-2.in"):
     """function to calculate the route for files in data folder with coordinates"""
     start_time = time.time()
-    f = open("data/pr2392-2.in", "r")
-    f.readline()
-    f.readline()
-    f.readline()
-    lines = int(f.readline().split()[2])
-    f.readline()
-    f.readline()
-    for i, li in enumerate(f.readlines(), start=1):
-        os.system('cls' if os.name=='nt' else 'clear')
-        print("Read '{}': {}/{} lines".format(f.name, i, lines))
-        c = li.split()
-        if not 'EOF' in c:
-            tmp = City("C" + str(c[0]), float(c[1]), float(c[2]))
-    print("---Time reading file and creating Cities: %s seconds ---\n" % str(time.time() - start_time))
-    
-    start_time = time.time()
-    print("Calculating distances...")
-    for city in list_of_cities:
-        city.calculate_distances()
-    print("---Time Calculating distances: %s seconds ---\n" % str(time.time() - start_time))
-    
+    instance = load_instance(path)
+    print("---Time reading '{0}' ({1} cities) and calculating distances: {2:.3f} seconds ---\n".format(
+        path, instance.dimension, time.time() - start_time))
+
     print("Searching for shortest way possible...")
     try:
         start_time = time.time()
@@ -785,27 +3055,15 @@ def specific_cities2():
         print("---Route found in %s seconds ---" % str(time.time() - start_time))
     except Exception as e:
         print("\n[ERROR]: %s\n" % e)
-    # try:
-    # except Exception, e:
-    #     print "[Exception]", e
 
 
-def specific_cities():
+def specific_cities(path="data/3x3.in"):
     """function to calculate the route for files in data folder with distances"""
+    # path = "data/bays29.in"
+    # path = "data/d493.in"
     try:
         start_time = time.time()
-        f = open("data/3x3.in", "r")
-        # f = open("data/bays29.in", "r")
-        # f = open("data/d493.in", "r")
-        # f = open("data/pr2392.in", "r")
-        lines = int(f.readline())
-        for i, li in enumerate(f.readlines(), start=1):
-            os.system('cls' if os.name=='nt' else 'clear')
-            print("Read '{}': {}/{} lines".format(f.name, i, lines))
-            d = {}
-            for j, line in enumerate(map(float, li.split()), start=1):
-                d["C" + str(j)] = line
-            tmp = City("C" + str(i), 10, 10, d)
+        instance = load_instance(path)
         print("--- %s seconds ---" % str(time.time() - start_time))
         band = True
     except Exception as e:
@@ -848,8 +3106,7 @@ def random_cities():
     h = City('h', 200, 10)
     # a1 = City('a1', 53, 99)
 
-    for city in list_of_cities:
-        city.calculate_distances()
+    calculate_distances()
     ######## create and run an application instance:
     app = App(n_generations=k_n_generations,pop_size=k_population_size, graph=True)
 
@@ -0,0 +1,420 @@
+'''
+TSPLIB reader for tsp-genetic-python
+
+Reads symmetric TSP instances in the TSPLIB format
+(http://comopt.ifi.uni-heidelberg.de/software/TSPLIB95/), as well as the plain
+files in data/ (the number of cities on the first line, then the full matrix).
+
+Numeric sections are parsed in bulk into NumPy arrays, and read_tsplib_cached()
+keeps the parsed instances in a binary on-disk cache. CoordinateDistances stands in
+for the distance matrix of instances too large to store one, and nearest_neighbors()
+finds the closest points of every point with a grid instead of the whole matrix.
+
+'''
+
+import functools
+import hashlib
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+
+# Edge weight types computed from NODE_COORD_SECTION
+COORD_WEIGHT_TYPES = ('EUC_2D', 'CEIL_2D', 'GEO', 'ATT')
+
+# Weight types that grow with the plane euclidean distance, so nearest_neighbors() applies
+PLANAR_WEIGHT_TYPES = ('EUC', 'EUC_2D', 'CEIL_2D', 'ATT')
+
+# Layout of EDGE_WEIGHT_SECTION: (triangle, with diagonal). A column-wise triangle
+# lists the same values as the opposite row-wise one, the matrix being symmetric.
+_EDGE_WEIGHT_FORMATS = {
+    'UPPER_ROW': ('upper', False),
+    'LOWER_ROW': ('lower', False),
+    'UPPER_DIAG_ROW': ('upper', True),
+    'LOWER_DIAG_ROW': ('lower', True),
+    'UPPER_COL': ('lower', False),
+    'LOWER_COL': ('upper', False),
+    'UPPER_DIAG_COL': ('lower', True),
+    'LOWER_DIAG_COL': ('upper', True),
+}
+
+# Bump when the layout of the cache files changes, so old entries are ignored
+_CACHE_VERSION = 1
+
+_KEYWORD_LINE = re.compile(r'^\s*([A-Z_]+)\s*(?::\s*(.*?))?\s*$', re.M)
+
+
+class TSPInstance(object):
+    """
+    A parsed instance.
+
+    self.name: NAME of the instance (the file name for plain files)
+    self.dimension: number of cities
+    self.edge_weight_type: EDGE_WEIGHT_TYPE ('EXPLICIT' for plain files)
+    self.edge_weight_format: EDGE_WEIGHT_FORMAT, or None
+    self.coords: (n x 2) float array from NODE_COORD_SECTION, or None
+    self.display_coords: (n x 2) float array from DISPLAY_DATA_SECTION, or None
+    self.weights: (n x n) array from EDGE_WEIGHT_SECTION (or the whole distance matrix when read from the cache), or None
+
+    self.distance_matrix(): The (n x n) matrix of distances, whichever way the instance gives them.
+    """
+    def __init__(self, name, dimension, edge_weight_type, edge_weight_format=None,
+                 coords=None, display_coords=None, weights=None):
+        self.name = name
+        self.dimension = dimension
+        self.edge_weight_type = edge_weight_type
+        self.edge_weight_format = edge_weight_format
+        self.coords = coords
+        self.display_coords = display_coords
+        self.weights = weights
+
+    def distance_matrix(self):
+        '''
+        self --> numpy.ndarray
+
+        Returns the explicit weights, or computes all the distances from the coordinates.
+        '''
+        if self.weights is not None:
+            return self.weights
+        return distance_matrix(self.coords, self.edge_weight_type)
+
+
+def read_tsplib(path):
+    '''
+    str --> TSPInstance
+
+    Reads a TSPLIB file, or a plain file of the number of cities followed by the full matrix.
+    '''
+    with open(path, 'r') as f:
+        text = f.read()
+
+    first_line = text.lstrip().split('\n', 1)[0]
+    if ':' not in first_line and 'SECTION' not in first_line:
+        values = np.fromstring(text, sep=' ')
+        n = int(values[0])
+        return TSPInstance(path, n, 'EXPLICIT', 'FULL_MATRIX',
+                           weights=_unpack_weights(values[1:], n, 'FULL_MATRIX'))
+
+    header = {}
+    sections = {}
+    keywords = list(_KEYWORD_LINE.finditer(text))
+    for i, match in enumerate(keywords):
+        keyword, value = match.group(1), match.group(2)
+        if keyword.endswith('_SECTION'):
+            end = keywords[i + 1].start() if i + 1 < len(keywords) else len(text)
+            sections[keyword] = text[match.end():end]
+        elif keyword == 'EOF':
+            break
+        elif value is not None:
+            header[keyword] = value
+
+    if 'DIMENSION' not in header:
+        raise ValueError('{0}: no DIMENSION in the header'.format(path))
+    n = int(header['DIMENSION'])
+    instance = TSPInstance(header.get('NAME', path), n, header.get('EDGE_WEIGHT_TYPE', 'EXPLICIT'),
+                           header.get('EDGE_WEIGHT_FORMAT'))
+
+    if 'NODE_COORD_SECTION' in sections:
+        instance.coords = _read_coords(sections['NODE_COORD_SECTION'], n, path)
+    if 'DISPLAY_DATA_SECTION' in sections:
+        instance.display_coords = _read_coords(sections['DISPLAY_DATA_SECTION'], n, path)
+    if instance.edge_weight_type == 'EXPLICIT':
+        if 'EDGE_WEIGHT_SECTION' not in sections:
+            raise ValueError('{0}: EXPLICIT weights without an EDGE_WEIGHT_SECTION'.format(path))
+        values = np.fromstring(sections['EDGE_WEIGHT_SECTION'], sep=' ')
+        instance.weights = _unpack_weights(values, n, instance.edge_weight_format or 'FULL_MATRIX', path)
+    elif instance.edge_weight_type in COORD_WEIGHT_TYPES:
+        if instance.coords is None:
+            raise ValueError('{0}: {1} weights without a NODE_COORD_SECTION'.format(path, instance.edge_weight_type))
+    else:
+        raise ValueError('{0}: unsupported EDGE_WEIGHT_TYPE {1}'.format(path, instance.edge_weight_type))
+    return instance
+
+
+def read_tsplib_cached(path, cache_dir, max_matrix_bytes=None):
+    '''
+    str, str, int --> TSPInstance
+
+    Same as read_tsplib(), with the distance matrix filled in (instance.weights), unless it
+    comes from coordinates and would take more than max_matrix_bytes. The first read of a
+    file saves its coordinates and its compact distance matrix in cache_dir, as .npy files
+    named after a hash of the file contents; later reads memory-map them instead of parsing
+    the text. Changing the file changes the hash, so an outdated entry is never used.
+    '''
+    hasher = hashlib.sha1(str(_CACHE_VERSION).encode())
+    with open(path, 'rb') as f:
+        hasher.update(f.read())
+    stem = os.path.join(cache_dir, '{0}-{1}'.format(os.path.basename(path), hasher.hexdigest()[:20]))
+
+    # the .json is written last, so its presence means the entry is complete
+    try:
+        with open(stem + '.json', 'r') as f:
+            meta = json.load(f)
+        arrays = {}
+        for name in meta['arrays']:
+            arrays[name] = np.load('{0}.{1}.npy'.format(stem, name), mmap_mode='r')
+        return TSPInstance(meta['name'], meta['dimension'], meta['edge_weight_type'],
+                           meta['edge_weight_format'], **arrays)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    instance = read_tsplib(path)
+    itemsize = 4 if instance.edge_weight_type in COORD_WEIGHT_TYPES else 8
+    if (instance.weights is not None or max_matrix_bytes is None
+            or instance.dimension ** 2 * itemsize <= max_matrix_bytes):
+        instance.weights = compact_weights(instance.distance_matrix())
+    arrays = dict((name, getattr(instance, name)) for name in ('coords', 'display_coords', 'weights')
+                  if getattr(instance, name) is not None)
+    os.makedirs(cache_dir, exist_ok=True)
+    for name, array in arrays.items():
+        _write_atomically('{0}.{1}.npy'.format(stem, name), lambda f: np.save(f, array))
+    meta = {'name': instance.name, 'dimension': instance.dimension, 'edge_weight_type': instance.edge_weight_type,
+            'edge_weight_format': instance.edge_weight_format, 'arrays': sorted(arrays)}
+    _write_atomically(stem + '.json', lambda f: f.write(json.dumps(meta).encode()))
+    return instance
+
+
+def _write_atomically(path, write):
+    # writes to a temporary file first, so other processes never see a half written file
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def compact_weights(matrix):
+    '''
+    array-like --> numpy.ndarray
+
+    Returns the matrix as int32 if all the weights are integral (and fit), as float64 otherwise.
+    '''
+    if np.asarray(matrix).dtype == np.int32:
+        return matrix
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if (len(matrix) and np.array_equal(matrix, np.rint(matrix))
+            and np.abs(matrix).max() < np.iinfo(np.int32).max):
+        matrix = matrix.astype(np.int32)
+    return matrix
+
+
+class CoordinateDistances(object):
+    """
+    Stands in for the (n x n) distance matrix of a coordinate instance too large to store
+    one: distances are computed from the coordinates when they are asked for. It offers the
+    part of the numpy.ndarray interface the solver uses: len(), shape, dtype, item(i, j),
+    matrix[i, j] (arrays of indices broadcast, as with fancy indexing) and matrix[rows].
+
+    self.coords: (n x 2) float array
+    self.edge_weight_type: how the distances are computed (see pair_distances())
+    self.cache_size: number of distances item() remembers
+    self.shape, self.dtype: those of the full matrix
+
+    self.item(i, j): Distance between points i and j. The most recently used ones are kept in
+        an LRU cache, since the local search keeps coming back to the same short edges.
+    """
+    ndim = 2
+
+    def __init__(self, coords, edge_weight_type, cache_size=2**20):
+        self.coords = np.ascontiguousarray(coords, dtype=np.float64)
+        self.edge_weight_type = edge_weight_type
+        self.cache_size = cache_size
+        n = len(self.coords)
+        self.shape = (n, n)
+        self.dtype = np.dtype(np.float64 if edge_weight_type == 'EUC' else np.int32)
+        self._xy = self.coords.tolist()
+        self.item = functools.lru_cache(maxsize=cache_size)(self._distance)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            i, j = key
+            if isinstance(i, (int, np.integer)) and isinstance(j, (int, np.integer)):
+                return self.dtype.type(self.item(i, j))
+            return pair_distances(self.coords[i], self.coords[j], self.edge_weight_type)
+        # one row, or a block of rows
+        return pair_distances(self.coords[key][..., None, :], self.coords, self.edge_weight_type)
+
+    def __getstate__(self):
+        # the cache does not pickle, worker processes start with an empty one
+        return (self.coords, self.edge_weight_type, self.cache_size)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def _distance(self, i, j):
+        (x1, y1), (x2, y2) = self._xy[i], self._xy[j]
+        dist = math.hypot(x1 - x2, y1 - y2)
+        if self.edge_weight_type == 'EUC':
+            return dist
+        if self.edge_weight_type == 'EUC_2D':
+            return int(math.floor(dist + 0.5))
+        if self.edge_weight_type == 'CEIL_2D':
+            return int(math.ceil(dist))
+        return int(pair_distances(self.coords[i], self.coords[j], self.edge_weight_type))
+
+
+def nearest_neighbors(coords, k):
+    '''
+    array (n x 2), int --> numpy.ndarray
+
+    The k nearest points (by euclidean distance) of every point, nearest first, as an
+    (n x k) int32 array. The points are bucketed in a uniform grid of about two points per
+    cell; each point looks at a square of cells around its own, wider and wider until its
+    k-th nearest candidate is closer than any point outside the square. With points spread
+    over the plane this takes O(n log n) instead of the O(n^2) of a full distance matrix.
+    '''
+    coords = np.ascontiguousarray(coords, dtype=np.float64)
+    n = len(coords)
+    k = min(k, n - 1)
+    neighbors = np.empty((n, k), dtype=np.int32)
+    if k <= 0:
+        return neighbors
+
+    lowest = coords.min(axis=0)
+    side = max(1, int(math.sqrt(n / 2.0)))
+    cell_size = float((coords.max(axis=0) - lowest).max()) / side or 1.0
+    grid_xy = np.minimum(((coords - lowest) / cell_size).astype(np.int64), side - 1)
+    cells = grid_xy[:, 0] * side + grid_xy[:, 1]
+    # works on the points sorted by cell: the points of a cell are contiguous,
+    # and the chunks below are close together in the plane
+    by_cell = np.argsort(cells, kind='stable')
+    cell_start = np.searchsorted(cells[by_cell], np.arange(side * side + 1))
+    coords, grid_xy = coords[by_cell], grid_xy[by_cell]
+    sorted_neighbors = np.empty((n, k), dtype=np.int64)
+
+    pending = np.arange(n)
+    radius = int(math.ceil(math.sqrt(k / (2.0 * math.pi)))) + 1
+    while len(pending):
+        offsets = np.arange(-radius, radius + 1)
+        window = (2 * radius + 1) ** 2
+        unresolved = []
+        # a chunk of points at a time keeps the candidate arrays small
+        chunks = np.array_split(pending, -(-len(pending) * window // 2**18))
+        while chunks:
+            chunk = chunks.pop()
+            wx = grid_xy[chunk, 0, None, None] + offsets[None, :, None]
+            wy = grid_xy[chunk, 1, None, None] + offsets[None, None, :]
+            inside = (wx >= 0) & (wx < side) & (wy >= 0) & (wy < side)
+            window_cells = np.where(inside, wx * side + wy, 0).reshape(len(chunk), -1)
+            counts = np.where(inside.reshape(len(chunk), -1),
+                              cell_start[window_cells + 1] - cell_start[window_cells], 0).ravel()
+            if counts.sum() > 2**22 and len(chunk) > 1:
+                # crowded cells: halves the chunk
+                chunks.extend(np.array_split(chunk, 2))
+                continue
+            # every (point, candidate) pair of the chunk, flattened
+            owner = np.repeat(np.repeat(np.arange(len(chunk)), window), counts)
+            first = np.repeat(cell_start[window_cells.ravel()] - np.cumsum(counts) + counts, counts)
+            candidate = first + np.arange(len(first))
+            point = chunk[owner]
+            keep = candidate != point
+            owner, candidate, point = owner[keep], candidate[keep], point[keep]
+            dist = np.hypot(coords[candidate, 0] - coords[point, 0], coords[candidate, 1] - coords[point, 1])
+            # sorts by owner, then distance, in one pass: the scaled distances are below 1
+            order = np.argsort(owner + dist / (2.0 * dist.max(initial=0.0) + 1.0))
+            owner, candidate, dist = owner[order], candidate[order], dist[order]
+            found = np.bincount(owner, minlength=len(chunk))
+            start = np.cumsum(found) - found
+            take = start[:, None] + np.minimum(np.arange(k), np.maximum(found - 1, 0)[:, None])
+            # nothing outside the square of cells is closer than radius cells
+            done = found >= k
+            if radius < side:
+                done[done] = dist[take[done, k - 1]] <= radius * cell_size
+            sorted_neighbors[chunk[done]] = candidate[take[done]]
+            unresolved.append(chunk[~done])
+        pending = np.concatenate(unresolved)
+        radius *= 2
+    neighbors[by_cell] = by_cell[sorted_neighbors]
+    return neighbors
+
+
+def _read_coords(section, n, path):
+    # "id x y" per line, parsed in one go
+    values = np.fromstring(section, sep=' ')
+    if len(values) != 3 * n:
+        raise ValueError('{0}: expected {1} coordinate lines of "id x y"'.format(path, n))
+    values = values.reshape(n, 3)
+    order = np.argsort(values[:, 0], kind='stable')
+    return np.ascontiguousarray(values[order, 1:])
+
+
+def _unpack_weights(values, n, edge_weight_format, path=''):
+    # turns the flat list of values into the full symmetric matrix
+    if edge_weight_format == 'FULL_MATRIX':
+        if len(values) != n * n:
+            raise ValueError('{0}: expected {1} values for a FULL_MATRIX'.format(path, n * n))
+        return values.reshape(n, n)
+    if edge_weight_format not in _EDGE_WEIGHT_FORMATS:
+        raise ValueError('{0}: unsupported EDGE_WEIGHT_FORMAT {1}'.format(path, edge_weight_format))
+    triangle, with_diagonal = _EDGE_WEIGHT_FORMATS[edge_weight_format]
+    offset = 0 if with_diagonal else 1
+    rows, cols = np.triu_indices(n, offset) if triangle == 'upper' else np.tril_indices(n, -offset)
+    if len(values) != len(rows):
+        raise ValueError('{0}: expected {1} values for {2}'.format(path, len(rows), edge_weight_format))
+    weights = np.zeros((n, n))
+    weights[rows, cols] = values
+    weights[cols, rows] = values
+    return weights
+
+
+def pair_distances(xy1, xy2, edge_weight_type):
+    '''
+    array (... x 2), array (... x 2), str --> numpy.ndarray
+
+    TSPLIB distance between the points xy1 and xy2, element by element (the arrays broadcast).
+    EUC_2D, CEIL_2D, GEO and ATT are integral and returned as int32. 'EUC' gives the plain,
+    unrounded euclidean distance (what the .csv and hand-written cities use) as float64.
+    '''
+    xy1 = np.asarray(xy1, dtype=np.float64)
+    xy2 = np.asarray(xy2, dtype=np.float64)
+    if edge_weight_type == 'GEO':
+        lat1, lon1 = _geo_radians(xy1[..., 0]), _geo_radians(xy1[..., 1])
+        lat2, lon2 = _geo_radians(xy2[..., 0]), _geo_radians(xy2[..., 1])
+        q1 = np.cos(lon1 - lon2)
+        q2 = np.cos(lat1 - lat2)
+        q3 = np.cos(lat1 + lat2)
+        dist = (6378.388 * np.arccos(np.clip(0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3), -1.0, 1.0)) + 1.0).astype(np.int32)
+        # a city is at distance 0 from itself
+        return np.where(np.all(xy1 == xy2, axis=-1), 0, dist).astype(np.int32)
+    dist = np.hypot(xy1[..., 0] - xy2[..., 0], xy1[..., 1] - xy2[..., 1])
+    if edge_weight_type == 'EUC':
+        return dist
+    if edge_weight_type == 'EUC_2D':
+        return np.floor(dist + 0.5).astype(np.int32)
+    if edge_weight_type == 'CEIL_2D':
+        return np.ceil(dist).astype(np.int32)
+    if edge_weight_type == 'ATT':
+        pseudo = dist / math.sqrt(10.0)
+        rounded = np.floor(pseudo + 0.5)
+        return np.where(rounded < pseudo, rounded + 1, rounded).astype(np.int32)
+    raise ValueError('unsupported EDGE_WEIGHT_TYPE {0}'.format(edge_weight_type))
+
+
+def _geo_radians(values):
+    # TSPLIB's DDD.MM (degrees and minutes) to radians. The degrees are truncated,
+    # as done by the reference implementations that produced the published optima.
+    degrees = np.trunc(values)
+    return 3.141592 * (degrees + 5.0 * (values - degrees) / 3.0) / 180.0
+
+
+def distance_matrix(coords, edge_weight_type):
+    '''
+    array (n x 2), str --> numpy.ndarray
+
+    All the distances between the points, computed in blocks of rows to keep the
+    temporary arrays small.
+    '''
+    coords = np.asarray(coords, dtype=np.float64)
+    n = len(coords)
+    dtype = np.float64 if edge_weight_type == 'EUC' else np.int32
+    matrix = np.empty((n, n), dtype=dtype)
+    block = max(1, 2**22 // max(n, 1))
+    for start in range(0, n, block):
+        rows = coords[start:start + block, None, :]
+        matrix[start:start + block] = pair_distances(rows, coords[None, :, :], edge_weight_type)
+    return matrix